@@ -1,4 +1,5 @@
 import numpy as np
+from smkernel import legendre
 
 
 def d2dfit(n, dis, p, b, ndeg, disfit):
@@ -20,33 +21,17 @@ def d2dfit(n, dis, p, b, ndeg, disfit):
     dx = 2.0 / float(n - 1)
 
     # 计算勒让德多项式值
-    for i in range(n):
-        x = -1.0 + float(i) * dx
-        # 零阶项
-        p[i, 0] = 1.0
-
-        if ndeg > 0:
-            # 一阶项
-            p[i, 1] = x
-            # 高阶项递推
-            for ideg in range(2, ndeg + 1):
-                p[i, ideg] = (
-                    (2 * ideg - 1) * x * p[i, ideg - 1] - (ideg - 1) * p[i, ideg - 2]
-                ) / float(ideg)
-
-    # 计算多项式系数
-    for ideg in range(ndeg + 1):
-        # 使用梯形法则计算积分
-        b[ideg] = 0.5 * (dis[0] * p[0, ideg] + dis[n - 1] * p[n - 1, ideg])
-        for i in range(1, n - 1):
-            b[ideg] += dis[i] * p[i, ideg]
-        b[ideg] = b[ideg] * dx * 0.5 * float(2 * ideg + 1)
+    legendre(n, ndeg, p)
+
+    # 计算多项式系数 (使用梯形法则计算积分)
+    pn = p[:n, : ndeg + 1]
+    w = np.ones(n)
+    w[0] = 0.5
+    w[n - 1] = 0.5
+    ideg = np.arange(ndeg + 1)
+    b[: ndeg + 1] = (w * dis[:n]) @ pn * dx * 0.5 * (2 * ideg + 1)
 
     # 计算拟合值
-    for i in range(n):
-        x = -1.0 + float(i) * dx
-        disfit[i] = 0.0
-        for ideg in range(ndeg + 1):
-            disfit[i] += b[ideg] * p[i, ideg]
+    disfit[:n] = pn @ b[: ndeg + 1]
 
     return
@@ -85,4 +85,65 @@ def disazi(rearth, lateq, loneq, latst, lonst):
     xnorth = dis * np.cos(anglec)
     yeast = dis * np.sin(anglec)
     
-    return xnorth, yeast
\ No newline at end of file
+    return xnorth, yeast
+
+def disazis(rearth, lateq, loneq, latst, lonst):
+    """
+    disazi的向量化版本, 一次计算多个台站相对于震中的位置
+
+    参数:
+    rearth: 地球半径
+    lateq: 震中纬度(度)
+    loneq: 震中经度(度)
+    latst: 台站纬度数组(度)
+    lonst: 台站经度数组(度)
+
+    返回:
+    xnorth, yeast: 台站相对于震中的北向和东向距离数组
+    """
+    PI = np.pi
+    PI2 = 2.0 * PI
+    DEGTORAD = PI / 180.0
+
+    latb = lateq * DEGTORAD
+    lonb = loneq * DEGTORAD
+    latc = np.asarray(latst, dtype=np.float64) * DEGTORAD
+    lonc = np.asarray(lonst, dtype=np.float64) * DEGTORAD
+
+    # 处理经度范围
+    if lonb < 0.0:
+        lonb += PI2
+    lonc = np.where(lonc < 0.0, lonc + PI2, lonc)
+
+    # 计算球面三角形的边
+    b = 0.5 * PI - latb
+    c = 0.5 * PI - latc
+
+    # 确定经度差角度 (与disazi的分支一致)
+    dlon = lonc - lonb
+    aa = np.abs(dlon)
+    wrap = aa > PI
+    aa = np.where(wrap, PI2 - aa, aa)
+    iangle = np.where(dlon > 0.0, np.where(wrap, -1, 1), np.where(wrap, 1, -1))
+
+    # 计算球面距离
+    s = np.cos(b) * np.cos(c) + np.sin(b) * np.sin(c) * np.cos(aa)
+    s = np.clip(s, -1.0, 1.0)
+    a = np.arccos(s)
+    dis = a * rearth
+
+    # 计算方位角
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = 0.5 * (a + b + c)
+        a2 = np.minimum(a, s)
+        b2 = np.minimum(b, s)
+        sin_term_c = np.sin(s - a2) * np.sin(s - b2) / (np.sin(a2) * np.sin(b2))
+        anglec = 2.0 * np.arcsin(np.clip(np.sqrt(sin_term_c), 0.0, 1.0))
+    anglec = np.where(iangle == 1, anglec, PI2 - anglec)
+    anglec = np.where(a * b * c == 0.0, 0.0, anglec)
+
+    # 计算直角坐标
+    xnorth = dis * np.cos(anglec)
+    yeast = dis * np.sin(anglec)
+
+    return xnorth, yeast
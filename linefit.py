@@ -14,33 +14,45 @@ def linefit(n, vel):
     bl: float, 终点值（最后一个点的拟合值）
     """
 
-    # 初始化矩阵和向量
-    bat = np.zeros(2)
-    mat = np.zeros((2, 2))
-
-    # 计算矩阵元素
-    bat[0] = np.sum(vel)
-    mat[0, 0] = float(n)
-
     # 计算带权重的和
     x = np.arange(n)
-    bat[1] = np.sum(vel * x)
-    mat[0, 1] = np.sum(x)
-    mat[1, 0] = mat[0, 1]
-    mat[1, 1] = np.sum(x * x)
+    # 累加和始终以float64计算 (vel可能以float32存储)
+    sumy = np.sum(vel, dtype=np.float64)
+    sumxy = np.sum(vel * x, dtype=np.float64)
+    return linefitsum(n, sumy, sumxy)
+
+
+def linefitsum(n, sumy, sumxy):
+    """
+    由累加和进行线性拟合 (供流式处理和参数扫描调用)
+
+    参数说明:
+    n: int或array, 数据点数量
+    sumy: float或array, 数据之和 sum(y[i])
+    sumxy: float或array, 加权和 sum(i*y[i])
+
+    返回值:
+    al: float, 起点值（第一个点的拟合值）
+    bl: float, 终点值（最后一个点的拟合值）
+    """
+
+    # 计算矩阵元素 (sum(i), sum(i*i) 使用闭合公式, 可对数组批量计算)
+    n = np.asarray(n, dtype=np.float64)
+    sumx = 0.5 * n * (n - 1.0)
+    sumx2 = (n - 1.0) * n * (2.0 * n - 1.0) / 6.0
 
     # 计算行列式
-    det = mat[0, 0] * mat[1, 1] - mat[0, 1] * mat[1, 0]
+    det = n * sumx2 - sumx * sumx
 
     # 检查奇异性
-    if det == 0:
+    if np.any(det == 0):
         raise ValueError("Error in linefit (singularity problem)!")
 
     # 计算拟合参数
-    al = (mat[1, 1] * bat[0] - mat[0, 1] * bat[1]) / det
-    bl = (mat[0, 0] * bat[1] - mat[1, 0] * bat[0]) / det
+    al = (sumx2 * sumy - sumx * sumxy) / det
+    bl = (n * sumxy - sumx * sumy) / det
 
     # 计算终点值
-    bl = al + bl * float(n - 1)
+    bl = al + bl * (n - 1.0)
 
     return al, bl
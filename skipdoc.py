@@ -1,3 +1,20 @@
+def iscomment(line):
+    """
+    判断是否为注释行或空行
+
+    以"#"、"!"、"c"或"C"开头的行为注释行(与原Fortran程序一致).
+    台站数据中以C开头的台站代码由smtable.DocLines.stations另行识别.
+
+    参数:
+    line: str, 文本行
+
+    返回:
+    bool: 是否为注释行或空行
+    """
+    line = line.strip()
+    return not line or line.startswith(("#", "!", "c", "C"))
+
+
 def skipdoc(file_handle):
     """
     跳过文件中的注释行和空行
@@ -9,7 +26,6 @@ def skipdoc(file_handle):
     str: 第一个非注释非空行，如果到达文件末尾则返回None
     """
     for line in file_handle:
-        line = line.strip()
-        if line and not line.startswith(("#", "!", "c", "C")):
-            return line
+        if not iscomment(line):
+            return line.strip()
     return None
@@ -59,6 +59,14 @@ class GlobalVars:
         self.outdir: str = ""  # 80字符
         self.inputfile: str = ""  # 80字符
         self.coseis: str = ""  # 80字符
+        self.cachedir: str = ""  # 中间结果缓存目录 (空表示不缓存)
+        self.backend: str = "numpy"  # 计算内核后端 (numpy/numba/auto)
+        self.dtype: str = "float64"  # 时间序列存储精度 (float64/float32)
+        self.qc: bool = False  # 是否在基线校正前进行快速质量检查
+        self.outfmt: str = "text"  # 校正结果的输出格式 (text/container/memmap)
+        self.compress: str = ""  # text格式的压缩方式 (空/gzip/bz2/xz)
+        self.complevel: int = 6  # 压缩级别
+        self.catalog: str = ""  # 持久化台站目录文件 (空表示不使用)
 
 
 class AllocatableVars:
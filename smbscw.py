@@ -1,6 +1,7 @@
 import numpy as np
 from linefit import linefit
 from bscmono import bscmono
+from smkernel import cumint
 from smalloc import (
     GlobalVars,
     AllocatableVars,
@@ -36,7 +37,7 @@ def smbscw(
 
     # 移除预事件静态偏移
     for j in range(3):
-        preoff = np.mean(av.acc[:ipre, j])
+        preoff = np.mean(av.acc[:ipre, j], dtype=np.float64)
         av.acc[:nwin, j] -= preoff
 
     # 选择信号和后事件时间窗口
@@ -50,9 +51,7 @@ def smbscw(
     # 对加速度记录进行积分并校正基线误差
     for j in range(3):
         # 计算未校正的速度
-        av.vel[0, j] = 0.0
-        for i in range(1, nwin):
-            av.vel[i, j] = av.vel[i - 1, j] + av.acc[i, j] * gv.dt
+        cumint(av.acc[:nwin, j], gv.dt, av.vel[:, j])
 
         # 拟合预事件基线
         al, bl = linefit(ipre, av.vel[:ipre, j])
@@ -64,11 +63,8 @@ def smbscw(
 
         # 寻找最大加速度
         ipgaj = ipre
-        pgaj = 0.0
-        for i in range(ipre, isdw):
-            if abs(av.acc[i, j]) > pgaj:
-                pgaj = abs(av.acc[i, j])
-                ipgaj = i
+        if isdw > ipre:
+            ipgaj += int(np.argmax(np.abs(av.acc[ipre:isdw, j])))
 
         # 进行单调基线校正
         av.offset[j, ist], av.rbserr[j, ist] = bscmono(
@@ -82,8 +78,6 @@ def smbscw(
         )
 
         # 计算位移
-        av.dis[0, j] = 0.0
-        for i in range(1, nwin):
-            av.dis[i, j] = av.dis[i - 1, j] + av.vel[i, j] * gv.dt
+        cumint(av.vel[:nwin, j], gv.dt, av.dis[:, j])
 
     return nwin
@@ -0,0 +1,129 @@
+"""
+中间结果磁盘缓存模块
+
+smgetout中与输出设置(gv.dt, gv.outdir等)无关的中间结果按处理阶段分层缓存:
+    dat: 读取的原始记录
+    pre: 预事件去均值后的记录及事件后平均加速度accoff
+    ene: 累积能量曲线、PGA位置及能量窗口长度
+    idx: PGA、SDW和DDW位置
+    qc:  QC预筛记录 (gv.qc为真时, 依赖dat阶段)
+每个阶段的键由该阶段的参数和上游阶段的键共同决定(依赖链), 上游数据或
+参数变化时下游阶段自动失效; 只修改下游设置时, 上游阶段直接从缓存读取.
+缓存总大小超过上限时按最近使用时间淘汰.
+"""
+
+import hashlib
+import json
+import os
+from typing import Callable, Dict, Optional
+import numpy as np
+
+
+class SmCache:
+    """分阶段的中间结果缓存"""
+
+    VERSION = 1  # 计算方法变化时递增, 使旧缓存全部失效
+
+    def __init__(self, root: str, maxbytes: int = 2 * 1024**3):
+        """
+        参数:
+            root: 缓存目录
+            maxbytes: 缓存总大小上限(字节)
+        """
+        self.root = root
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+        self.nbytes = sum(os.path.getsize(path) for path, _ in self._entries())
+
+    def key(self, stage: str, deps: Dict) -> str:
+        """由阶段名和依赖参数计算缓存键"""
+        text = json.dumps([self.VERSION, stage, deps], sort_keys=True, default=repr)
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _path(self, stage: str, key: str) -> str:
+        return os.path.join(self.root, stage, f"{key}.npz")
+
+    def load(self, stage: str, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """读取缓存项, 不存在或损坏时返回None"""
+        path = self._path(stage, key)
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                data = {name: npz[name] for name in npz.files}
+            os.utime(path)  # 更新最近使用时间
+        except (OSError, ValueError, KeyError):
+            return None
+        return data
+
+    def save(self, stage: str, key: str, data: Dict[str, np.ndarray]):
+        """写入缓存项 (先写临时文件再原子替换)"""
+        path = self._path(stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **data)
+        if os.path.exists(path):
+            self.nbytes -= os.path.getsize(path)
+        os.replace(tmp, path)
+        self.nbytes += os.path.getsize(path)
+        if self.nbytes > self.maxbytes:
+            self.evict()
+
+    def memo(
+        self,
+        stage: str,
+        key: str,
+        compute: Callable[[], Dict[str, np.ndarray]],
+    ) -> Dict[str, np.ndarray]:
+        """
+        读取或计算一个阶段的结果
+
+        参数:
+            stage: 阶段名
+            key: 缓存键 (由key()计算, 依赖参数中应包含上游阶段的键)
+            compute: 缓存未命中时调用的计算函数
+
+        返回:
+            Dict[str, np.ndarray]: 本阶段的结果
+        """
+        data = self.load(stage, key)
+        if data is None:
+            self.misses += 1
+            data = {name: np.asarray(v) for name, v in compute().items()}
+            self.save(stage, key, data)
+        else:
+            self.hits += 1
+        return data
+
+    def _entries(self):
+        """遍历所有缓存文件, 返回(路径, 最近使用时间)"""
+        for stage in os.listdir(self.root):
+            folder = os.path.join(self.root, stage)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if name.endswith(".npz"):
+                    path = os.path.join(folder, name)
+                    yield path, os.path.getmtime(path)
+
+    def evict(self):
+        """按最近使用时间淘汰缓存项, 直至总大小降到上限的80%"""
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        target = int(0.8 * self.maxbytes)
+        for path, _ in entries:
+            if self.nbytes <= target:
+                break
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                continue
+            self.nbytes -= size
+
+    def clear(self, stage: Optional[str] = None):
+        """清除某一阶段(或全部)的缓存"""
+        for path, _ in list(self._entries()):
+            if stage is None or os.path.basename(os.path.dirname(path)) == stage:
+                self.nbytes -= os.path.getsize(path)
+                os.remove(path)
@@ -0,0 +1,249 @@
+"""
+跨事件持久化的台站目录及空间索引
+
+固定台网的台站在不同事件之间几乎不变. 目录保存每个台站的代码、经纬度
+和预先计算的单位球面直角坐标, 并将单位向量按边长CATALOG_CELL的立方网格
+分桶排序. 对新的震源, stdismin/stdismax距离范围的查询只检查与查询球相交
+的网格单元, 得到候选台站后再由smgetinp用disazis精确计算震中距.
+
+目录按台站代码保存一份坐标. 同一代码可能出现在多个SMDataInfo.dat中
+且坐标不同, 因此每次运行都将当前台站表的坐标与目录逐个比较(向量化),
+只对新增或坐标不同的台站重新计算直角坐标和网格位置; 查询结果总是对应
+当前台站表的坐标. 合并过的文件及其修改时间和大小记录在目录中.
+"""
+
+import json
+import os
+from typing import Dict, List, Tuple
+import numpy as np
+import numpy.typing as npt
+from smtable import StationTable
+
+CATALOG_CELL = 0.008  # 网格边长(单位球上的弦长, 约51 km)
+
+
+def _unit(
+    lat: npt.NDArray[np.float64], lon: npt.NDArray[np.float64]
+) -> npt.NDArray[np.float64]:
+    """经纬度(度) -> (n x 3) 单位球面直角坐标"""
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    return np.stack(
+        (np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)), axis=-1
+    )
+
+
+class SmCatalog:
+    """台站目录 (代码、坐标、单位向量及网格索引)"""
+
+    VERSION = 1  # 文件格式变化时递增, 使旧目录重新建立
+
+    def __init__(self, path: str, cell: float = CATALOG_CELL):
+        """
+        参数:
+            path: 目录文件路径 (.npz), 不存在时建立空目录
+            cell: 网格边长(单位球上的弦长)
+        """
+        self.path = path
+        self.cell = cell
+        self.ncell = int(2.0 / cell) + 2  # 每个坐标轴上的单元数
+        self.code: List[str] = []
+        self.lat = np.zeros(0, dtype=np.float64)
+        self.lon = np.zeros(0, dtype=np.float64)
+        self.xyz = np.zeros((0, 3), dtype=np.float64)
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.order = np.zeros(0, dtype=np.int64)
+        self.sources: Dict[str, List[float]] = {}
+        self.dirty = False
+        if os.path.exists(path):
+            self._load()
+        self.pos = {code: i for i, code in enumerate(self.code)}
+
+    def _load(self):
+        """读取目录文件, 版本或网格不一致时忽略"""
+        try:
+            with np.load(self.path, allow_pickle=False) as npz:
+                meta = json.loads(str(npz["meta"]))
+                if meta["version"] != self.VERSION or meta["cell"] != self.cell:
+                    return
+                self.code = [str(code) for code in npz["code"]]
+                self.lat = npz["lat"]
+                self.lon = npz["lon"]
+                self.xyz = npz["xyz"]
+                self.keys = npz["keys"]
+                self.order = npz["order"]
+                self.sources = meta["sources"]
+        except (OSError, ValueError, KeyError):
+            self.dirty = True
+
+    def save(self):
+        """写出目录文件 (有变化时; 先写临时文件再原子替换)"""
+        if not self.dirty:
+            return
+        meta = {"version": self.VERSION, "cell": self.cell, "sources": self.sources}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                meta=np.array(json.dumps(meta)),
+                code=np.array(self.code, dtype=str),
+                lat=self.lat,
+                lon=self.lon,
+                xyz=self.xyz,
+                keys=self.keys,
+                order=self.order,
+            )
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+    def _cellof(self, xyz: npt.NDArray[np.float64]) -> npt.NDArray[np.int64]:
+        """单位向量所在的网格单元 (各轴的整数坐标)"""
+        return np.floor((xyz + 1.0) / self.cell).astype(np.int64)
+
+    def _key(self, ijk: npt.NDArray[np.int64]) -> npt.NDArray[np.int64]:
+        """网格单元 -> 排序键 (同一(ix, iy)的单元沿iz连续)"""
+        return (ijk[..., 0] * self.ncell + ijk[..., 1]) * self.ncell + ijk[..., 2]
+
+    def update(self, source: str, table: StationTable) -> int:
+        """
+        用一个SMDataInfo.dat的台站表增量更新目录
+
+        参数:
+            source: SMDataInfo.dat路径
+            table: 该文件的台站表
+
+        返回:
+            int: 新增或坐标与目录不同的台站数量
+        """
+        source = os.path.abspath(source)
+        st = os.stat(source)
+        stamp = [st.st_mtime, float(st.st_size)]
+        if self.sources.get(source) != stamp:
+            self.sources[source] = stamp
+            self.dirty = True
+
+        # 文件未变化时也要比较: 同一代码的坐标可能已被其他文件覆盖
+        rows = np.array([self.pos.get(code, -1) for code in table.code], dtype=np.int64)
+        known = rows >= 0
+        moved = np.zeros(len(rows), dtype=np.bool_)
+        moved[known] = (self.lat[rows[known]] != table.lat[known]) | (
+            self.lon[rows[known]] != table.lon[known]
+        )
+        if not np.any(~known | moved):
+            return 0
+
+        # 新增台站 (表中重复的代码以最后一行为准)
+        for i in np.nonzero(~known)[0]:
+            code = table.code[i]
+            if code not in self.pos:
+                self.pos[code] = len(self.code)
+                self.code.append(code)
+            rows[i] = self.pos[code]
+        nnew = len(self.code) - len(self.lat)
+        if nnew > 0:
+            self.lat = np.concatenate((self.lat, np.zeros(nnew)))
+            self.lon = np.concatenate((self.lon, np.zeros(nnew)))
+            self.xyz = np.concatenate((self.xyz, np.zeros((nnew, 3))))
+            self.keys = np.concatenate((self.keys, np.zeros(nnew, dtype=np.int64)))
+
+        # 只对新增和移动的台站重新计算坐标和网格位置
+        upd = ~known | moved
+        r = rows[upd]
+        self.lat[r] = table.lat[upd]
+        self.lon[r] = table.lon[upd]
+        self.xyz[r] = _unit(table.lat[upd], table.lon[upd])
+        self.keys[r] = self._key(self._cellof(self.xyz[r]))
+        self.order = np.argsort(self.keys, kind="stable")
+        self.dirty = True
+        return int(np.sum(upd))
+
+    def query(
+        self, lat: float, lon: float, dmin: float, dmax: float, rearth: float
+    ) -> List[str]:
+        """
+        查询可能位于震中距范围[dmin, dmax]内的台站
+
+        返回候选集合: 包含所有范围内的台站, 也可能包含少量范围外的台站,
+        需要再精确计算震中距.
+
+        参数:
+            lat, lon: 震中经纬度(度)
+            dmin, dmax: 震中距范围(m)
+            rearth: 地球半径(m)
+
+        返回:
+            List[str]: 候选台站代码
+        """
+        if len(self.code) == 0:
+            return []
+        arc = dmax / rearth
+        if arc >= np.pi:
+            return list(self.code)
+
+        # 球面距离 <= arc 等价于单位向量的弦长 <= 2 sin(arc/2)
+        u0 = _unit(np.float64(lat), np.float64(lon))
+        r = 2.0 * np.sin(0.5 * arc) + 1.0e-12
+        lo = self._cellof(u0 - r)
+        hi = self._cellof(u0 + r)
+
+        # 每个(ix, iy)对应排序键中的一个连续区间
+        ix, iy = np.meshgrid(
+            np.arange(lo[0], hi[0] + 1), np.arange(lo[1], hi[1] + 1), indexing="ij"
+        )
+        ix = ix.ravel()
+        iy = iy.ravel()
+        k0 = self._key(np.stack((ix, iy, np.full_like(ix, lo[2])), axis=-1))
+        k1 = self._key(np.stack((ix, iy, np.full_like(ix, hi[2])), axis=-1))
+        skeys = self.keys[self.order]
+        i0 = np.searchsorted(skeys, k0, side="left")
+        i1 = np.searchsorted(skeys, k1, side="right")
+        spans = [self.order[a:b] for a, b in zip(i0, i1) if b > a]
+        cand = np.concatenate(spans) if spans else np.zeros(0, dtype=np.int64)
+
+        # 弦长精确筛选
+        near = np.sum((self.xyz[cand] - u0) ** 2, axis=1) <= r * r
+        cand = np.sort(cand[near])
+        if dmin > 0.0:
+            chord = max(2.0 * np.sin(0.5 * min(dmin / rearth, np.pi)) - 1.0e-12, 0.0)
+            far = np.sum((self.xyz[cand] - u0) ** 2, axis=1) >= chord * chord
+            cand = cand[far]
+        return [self.code[i] for i in cand]
+
+
+def smcandidates(
+    path: str,
+    source: str,
+    table: StationTable,
+    lat: float,
+    lon: float,
+    dmin: float,
+    dmax: float,
+    rearth: float,
+) -> Tuple[npt.NDArray[np.int64], int]:
+    """
+    用持久化目录选出台站表中可能在震中距范围内的行
+
+    参数:
+        path: 目录文件路径
+        source: SMDataInfo.dat路径
+        table: 该文件的台站表
+        lat, lon: 震中经纬度(度)
+        dmin, dmax: 震中距范围(m)
+        rearth: 地球半径(m)
+
+    返回:
+        Tuple[np.ndarray, int]: (候选行号(升序), 目录中更新的台站数量)
+    """
+    catalog = SmCatalog(path)
+    nupd = catalog.update(source, table)
+    catalog.save()
+
+    # 台站代码重复时无法按代码对应, 退回到全部台站
+    if len(set(table.code)) != len(table.code):
+        return np.arange(len(table.code), dtype=np.int64), nupd
+
+    pos = {code: i for i, code in enumerate(table.code)}
+    codes = catalog.query(lat, lon, dmin, dmax, rearth)
+    rows = np.array(sorted(pos[code] for code in codes if code in pos), dtype=np.int64)
+    return rows, nupd
@@ -1,176 +1,482 @@
+import json
 import numpy as np
 import os
+from typing import Dict, List, Optional, Tuple, Union
 from smalloc import Constants, GlobalVars, AllocatableVars
 from skipdoc import skipdoc
 from smbscw import smbscw
+from smcache import SmCache
+from smkernel import setbackend
+from smlog import log, smprogress, smprogressend
+from smoutput import SMC_FILE, SmBlcWriter, SmContainerWriter, writeblc
+from smqc import QC_CLIPRUN, QC_FLATFRAC, QC_SNRMIN, smqcsta, smqcwrite
 
 
-def smgetout(const: Constants, gv: GlobalVars, av: AllocatableVars) -> bool:
+def smreaddat(gv: GlobalVars, av: AllocatableVars, ist: int) -> np.ndarray:
     """
-    读取强震动数据并进行基线校正
+    读取单个台站的三分量强震动记录
+
+    参数:
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例，包含可分配变量
+        ist: 台站索引
+
+    返回:
+        np.ndarray: (nwin x 3) 原始记录，分量顺序由gv.icmp给出，精度为gv.dtype
+    """
+    data_file = os.path.join(gv.datadir, f"{av.stcode[ist]}.dat")
+    data_list = []
+    with open(data_file, "r") as f:
+        for line in f:
+            values = list(map(float, line.split()))
+            if len(values) >= 3:
+                data_list.append([values[i - 1] for i in gv.icmp])
+            if len(data_list) >= gv.nwinmax:
+                break
+
+    return np.array(data_list, dtype=gv.dtype)
+
+
+def smdatkey(gv: GlobalVars, av: AllocatableVars, ist: int, cache: SmCache) -> str:
+    """
+    原始记录(缓存阶段dat)的缓存键: 由文件路径、大小、修改时间及读取设置决定
+
+    参数:
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例，包含可分配变量
+        ist: 台站索引
+        cache: SmCache实例
+
+    返回:
+        str: 缓存键
+    """
+    data_file = os.path.join(gv.datadir, f"{av.stcode[ist]}.dat")
+    stat = os.stat(data_file)
+    return cache.key(
+        "dat",
+        {
+            "file": os.path.abspath(data_file),
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "icmp": list(gv.icmp),
+            "nwinmax": gv.nwinmax,
+            "dtype": gv.dtype,
+        },
+    )
+
+
+def smqcget(
+    const: Constants,
+    gv: GlobalVars,
+    av: AllocatableVars,
+    ist: int,
+    cache: Optional[SmCache] = None,
+) -> Tuple[Dict, Optional[np.ndarray]]:
+    """
+    对单个台站进行QC预筛, 给定cache时QC记录和原始记录都经由缓存
+
+    缓存命中时不解析记录文件, 已被拒绝的台站在重复处理时不再读取数据;
+    QC读取的原始记录存入dat阶段, 通过的台站在smpick中直接使用.
 
     参数:
         const: Constants实例，包含常量
         gv: GlobalVars实例，包含全局变量
         av: AllocatableVars实例，包含可分配变量
+        ist: 台站索引
+        cache: SmCache实例，None表示不使用缓存
 
     返回:
-        bool: 是否成功
+        Tuple[Dict, Optional[np.ndarray]]: (QC记录, 本次解析的原始记录);
+            使用缓存时原始记录为None (smpick从缓存读取)
     """
-    print(" 读取强震动数据...")
-    print(" 进行基线校正...")
+    if cache is None:
+        raw = smreaddat(gv, av, ist)
+        return smqcsta(const, gv, av, ist, raw), raw
 
-    print(
-        "   Station  Lat[deg]  Lon[deg] Epdis[km]   East[m]  North[m]     Up[m]"
-        "   RbserrE   RbserrN   RbserrU"
+    datkey = smdatkey(gv, av, ist, cache)
+    qckey = cache.key(
+        "qc",
+        {
+            "dat": datkey,
+            "start": float(av.start[ist]),
+            "ponset": float(av.ponset[ist]),
+            "sample": float(av.sample[ist]),
+            "dt": gv.dt,
+            "const": repr(const),
+            "limits": [QC_SNRMIN, QC_CLIPRUN, QC_FLATFRAC],
+        },
     )
 
-    try:
-        for ist in range(gv.nst):
-            # 读取强震动数据
-            data_file = os.path.join(gv.datadir, f"{av.stcode[ist]}.dat")
-            data_list = []
-            with open(data_file, "r") as f:
-                for line in f:
-                    values = list(map(float, line.split()))
-                    if len(values) >= 3:
-                        data_list.append([values[i - 1] for i in gv.icmp])
-                    if len(data_list) >= gv.nwinmax:
-                        break
-
-            nwin = len(data_list)
-            av.length[ist] = (nwin - 1) * av.sample[ist]
-            dat = np.array(data_list)
-
-            # 初始地震前基线校正
-            ipre = 1 + int(
-                (av.ponset[ist] - av.start[ist] - const.DTP) / av.sample[ist]
-            )
-            accoff = np.zeros(3)
+    def screen():
+        raw = cache.memo("dat", datkey, lambda: {"dat": smreaddat(gv, av, ist)})
+        return {"qc": json.dumps(smqcsta(const, gv, av, ist, raw["dat"]))}
+
+    return json.loads(str(cache.memo("qc", qckey, screen)["qc"])), None
 
-            for j in range(3):
-                delta = np.mean(dat[:ipre, j])
-                dat[:, j] -= delta
-                accoff[j] = np.mean(dat[ipre:, j])
 
-            # 确定PGA时间和地震后时期的开始
-            ene = np.zeros(nwin)
-            sigma = np.sqrt(np.sum((dat[ipre:] - accoff) ** 2, axis=1))
-            ipga = ipre + np.argmax(sigma)
-            pga = np.max(sigma)
+def smpick(
+    const: Constants,
+    gv: GlobalVars,
+    av: AllocatableVars,
+    ist: int,
+    cache: Optional[SmCache] = None,
+    dat: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, int, int, int]:
+    """
+    读取记录, 进行初始预事件基线校正并确定PGA、SDW和DDW位置
 
-            ene[ipre:] = np.cumsum(sigma)
-            av.tpga[ist] = av.start[ist] + ipga * av.sample[ist]
+    这些结果只依赖于原始数据和处理常量, 与输出设置无关; 给定cache时
+    各阶段(dat/pre/ene/idx)的结果从磁盘缓存读取或写入.
 
-            nwin = min(
-                nwin,
-                ipre + 20 * round((av.tpga[ist] - av.ponset[ist]) / av.sample[ist]),
-            )
+    参数:
+        const: Constants实例，包含常量
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例，包含可分配变量
+        ist: 台站索引
+        cache: SmCache实例，None表示不使用缓存
+        dat: 已读取的原始记录，None表示从文件读取
+
+    返回:
+        Tuple[np.ndarray, int, int, int]: (去均值后的记录, ipga, isdw, iddw)
+    """
+    ipre = 1 + int((av.ponset[ist] - av.start[ist] - const.DTP) / av.sample[ist])
 
-            # 确定SDW和DDW时间
-            isdw = ipre + np.searchsorted(ene[ipre:nwin], const.SDW * ene[nwin - 1])
-            iddw = ipre + np.searchsorted(ene[ipre:nwin], const.DDW * ene[nwin - 1])
+    def readdat():
+        return {"dat": smreaddat(gv, av, ist) if dat is None else dat}
 
-            av.tsdw[ist] = av.start[ist] + isdw * av.sample[ist]
-            av.tddw[ist] = av.start[ist] + iddw * av.sample[ist]
+    def demean(dat):
+        # 初始地震前基线校正
+        accoff = np.zeros(3)
+        for j in range(3):
+            delta = np.mean(dat[:ipre, j], dtype=np.float64)
+            dat[:, j] -= delta
+            accoff[j] = np.mean(dat[ipre:, j], dtype=np.float64)
+        return {"dat": dat, "accoff": accoff}
 
-            if av.tsdw[ist] < av.tpga[ist]:
-                av.tpga[ist] = av.tsdw[ist]
+    def energy(dat, accoff):
+        # 确定PGA时间和地震后时期的开始
+        nwin = len(dat)
+        ene = np.zeros(nwin)
+        sigma = np.sqrt(np.sum((dat[ipre:] - accoff) ** 2, axis=1))
+        ipga = ipre + np.argmax(sigma)
+        ene[ipre:] = np.cumsum(sigma)
+        tpga = av.start[ist] + ipga * av.sample[ist]
+        nwin = min(
+            nwin,
+            ipre + 20 * round((tpga - av.ponset[ist]) / av.sample[ist]),
+        )
+        return {"ene": ene, "ipga": ipga, "nwin": nwin}
 
-            # 调整长度
-            av.length[ist] = min(
-                av.length[ist],
-                av.tddw[ist]
-                - av.start[ist]
-                + min(av.tpga[ist] - av.start[ist], const.PSTWIN),
-            )
-            nwin = int(av.length[ist] / av.sample[ist])
+    def window(ene, nwin):
+        # 确定SDW和DDW时间
+        isdw = ipre + np.searchsorted(ene[ipre:nwin], const.SDW * ene[nwin - 1])
+        iddw = ipre + np.searchsorted(ene[ipre:nwin], const.DDW * ene[nwin - 1])
+        return {"isdw": isdw, "iddw": iddw}
 
-            # 检查数据是否足够
-            av.okay[ist] = av.tsdw[ist] <= av.start[ist] + av.length[ist] - min(
-                av.tpga[ist] - av.start[ist], const.PSTWIN
-            )
+    if cache is None:
+        pre = demean(readdat()["dat"])
+        res = energy(pre["dat"], pre["accoff"])
+        res.update(window(res["ene"], res["nwin"]))
+        return pre["dat"], int(res["ipga"]), int(res["isdw"]), int(res["iddw"])
+
+    # 依赖链: dat -> pre -> ene -> idx
+    datkey = smdatkey(gv, av, ist, cache)
+    prekey = cache.key("pre", {"dat": datkey, "ipre": ipre})
+    pre = cache.memo(
+        "pre", prekey, lambda: demean(cache.memo("dat", datkey, readdat)["dat"])
+    )
+    enekey = cache.key(
+        "ene",
+        {
+            "pre": prekey,
+            "start": float(av.start[ist]),
+            "ponset": float(av.ponset[ist]),
+            "sample": float(av.sample[ist]),
+        },
+    )
+    idxkey = cache.key("idx", {"ene": enekey, "SDW": const.SDW, "DDW": const.DDW})
+
+    def indices():
+        res = cache.memo("ene", enekey, lambda: energy(**pre))
+        idx = window(res["ene"], int(res["nwin"]))
+        idx["ipga"] = res["ipga"]
+        return idx
+
+    idx = cache.memo("idx", idxkey, indices)
+    return pre["dat"], int(idx["ipga"]), int(idx["isdw"]), int(idx["iddw"])
 
-            if not av.okay[ist]:
-                print(f"{av.stcode[ist]}   ... 数据长度不足 ...")
-                continue
 
-            # 降采样
-            if av.sample[ist] < gv.dt:
-                nsam = round(gv.dt / av.sample[ist])
-            else:
-                nsam = 1
+def smbscwtail(
+    ist: int, nwin: int, gv: GlobalVars, av: AllocatableVars, const: Constants
+) -> int:
+    """
+    调用smbscw, 并将其缩短的窗口之后的输出行清零
+
+    smbscw可能缩短时间窗口, 而输出仍为nwin行; 不清零时这些行保留着此前
+    处理过的台站的数据, 输出会随处理顺序(调度、工作进程)而不同.
 
-            ipre = 1 + int((av.ponset[ist] - av.start[ist] - const.DTP) / gv.dt)
-            nwin = nwin // nsam
+    参数:
+        ist: 台站索引
+        nwin: 输出的时间窗口长度
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例，包含可分配变量
+        const: Constants实例，包含常量
 
-            # 进行降采样
-            for i in range(nwin):
-                l = max(0, int((i - 0.5) * gv.dt / av.sample[ist]))
-                for j in range(3):
-                    av.acc[i, j] = gv.accunit * np.mean(dat[l : l + nsam, j])
+    返回:
+        int: smbscw给出的有效窗口长度
+    """
+    nbsc = smbscw(ist, nwin, gv, av, const)
+    for buf in (av.vel, av.err, av.dis):
+        buf[nbsc:nwin] = 0.0
+    return nbsc
 
-            av.sample[ist] = gv.dt
 
-            # 进行基线校正
+def smgetsta(
+    const: Constants,
+    gv: GlobalVars,
+    av: AllocatableVars,
+    ist: int,
+    cache: Optional[SmCache] = None,
+    report: Optional[List[Dict]] = None,
+    store: Union[SmContainerWriter, SmBlcWriter, None] = None,
+) -> bool:
+    """
+    对单个台站进行基线校正并输出校正后的时间序列
 
-            smbscw(ist, nwin, gv, av, const)
+    参数:
+        const: Constants实例，包含常量
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例，包含可分配变量
+        ist: 台站索引
+        cache: SmCache实例，None表示不使用缓存
+        report: gv.qc为真时, QC记录追加到此列表
+        store: smstore创建的输出, None表示直接写出<stcode>_blc.dat文本文件;
+            gv.outfmt为"memmap"时smbscw直接写入其中预留的数据块
 
-            # 输出校正结果
-            print(
-                f"{av.stcode[ist]:10} {av.lat[ist]:8.4f} {av.lon[ist]:8.4f}"
-                f" {av.epidis[ist]/const.KM2M:8.3f}"
-                f" {av.offset[0,ist]:8.3f} {av.offset[1,ist]:8.3f}"
-                f" {av.offset[2,ist]:8.3f}"
-                f" {av.rbserr[0,ist]:8.4f} {av.rbserr[1,ist]:8.4f}"
-                f" {av.rbserr[2,ist]:8.4f}"
+    返回:
+        bool: 数据是否足够 (即av.okay[ist])
+    """
+    # 快速质量检查, 不合格的台站跳过完整的处理流程
+    raw = None
+    if gv.qc:
+        qc, raw = smqcget(const, gv, av, ist, cache)
+        if report is not None:
+            report.append(qc)
+        if not qc["okay"]:
+            av.okay[ist] = False
+            log.debug(
+                f"{av.stcode[ist]}   ... QC未通过: {','.join(qc['reasons'])} ...",
+                extra={
+                    "station": av.stcode[ist],
+                    "okay": False,
+                    "reason": qc["reasons"][0],
+                },
             )
+            return False
+
+    # 读取强震动数据并确定PGA、SDW和DDW位置
+    dat, ipga, isdw, iddw = smpick(const, gv, av, ist, cache, raw)
 
-            # 保存校正后的数据
+    nwin = len(dat)
+    av.length[ist] = (nwin - 1) * av.sample[ist]
+
+    av.tpga[ist] = av.start[ist] + ipga * av.sample[ist]
+    av.tsdw[ist] = av.start[ist] + isdw * av.sample[ist]
+    av.tddw[ist] = av.start[ist] + iddw * av.sample[ist]
+
+    if av.tsdw[ist] < av.tpga[ist]:
+        av.tpga[ist] = av.tsdw[ist]
+
+    # 调整长度
+    av.length[ist] = min(
+        av.length[ist],
+        av.tddw[ist]
+        - av.start[ist]
+        + min(av.tpga[ist] - av.start[ist], const.PSTWIN),
+    )
+    nwin = int(av.length[ist] / av.sample[ist])
+
+    # 检查数据是否足够
+    av.okay[ist] = av.tsdw[ist] <= av.start[ist] + av.length[ist] - min(
+        av.tpga[ist] - av.start[ist], const.PSTWIN
+    )
+
+    if not av.okay[ist]:
+        log.debug(
+            f"{av.stcode[ist]}   ... 数据长度不足 ...",
+            extra={"station": av.stcode[ist], "okay": False, "reason": "short_record"},
+        )
+        return False
+
+    # 降采样
+    if av.sample[ist] < gv.dt:
+        nsam = round(gv.dt / av.sample[ist])
+    else:
+        nsam = 1
+
+    ipre = 1 + int((av.ponset[ist] - av.start[ist] - const.DTP) / gv.dt)
+    nwin = nwin // nsam
+
+    # 进行降采样
+    for i in range(nwin):
+        l = max(0, int((i - 0.5) * gv.dt / av.sample[ist]))
+        for j in range(3):
+            av.acc[i, j] = gv.accunit * np.mean(dat[l : l + nsam, j], dtype=np.float64)
+
+    av.sample[ist] = gv.dt
+
+    # 进行基线校正
+    if store is not None and gv.outfmt == "memmap":
+        # vel/err/dis指向输出文件中预留的数据块, smbscw直接写入
+        block = store.reserve(av.stcode[ist], nwin)
+        buffers = av.vel, av.err, av.dis
+        av.vel, av.err, av.dis = block[:, 6:9], block[:, 3:6], block[:, 9:12]
+        try:
+            smbscwtail(ist, nwin, gv, av, const)
+        finally:
+            av.vel, av.err, av.dis = buffers
+        store.commit(av.stcode[ist], av.start[ist], gv.dt)
+    else:
+        smbscwtail(ist, nwin, gv, av, const)
+
+        # 保存校正后的数据
+        vel, err, dis = av.vel[:nwin], av.err[:nwin], av.dis[:nwin]
+        if store is not None:
+            store.append(av.stcode[ist], av.start[ist], gv.dt, vel, err, dis)
+        else:
             outfile = os.path.join(gv.outdir, f"{av.stcode[ist]}_blc.dat")
-            with open(outfile, "w") as f:
+            writeblc(outfile, av.start[ist], gv.dt, vel, err, dis)
+
+    # 输出校正结果
+    log.debug(
+        f"{av.stcode[ist]:10} {av.lat[ist]:8.4f} {av.lon[ist]:8.4f}"
+        f" {av.epidis[ist]/const.KM2M:8.3f}"
+        f" {av.offset[0,ist]:8.3f} {av.offset[1,ist]:8.3f}"
+        f" {av.offset[2,ist]:8.3f}"
+        f" {av.rbserr[0,ist]:8.4f} {av.rbserr[1,ist]:8.4f}"
+        f" {av.rbserr[2,ist]:8.4f}",
+        extra={
+            "station": av.stcode[ist],
+            "okay": True,
+            "epidis": av.epidis[ist] / const.KM2M,
+            "offset": av.offset[:, ist].tolist(),
+            "rbserr": av.rbserr[:, ist].tolist(),
+        },
+    )
+
+    return True
+
+
+def smstore(
+    gv: GlobalVars, path: str
+) -> Union[SmContainerWriter, SmBlcWriter, None]:
+    """
+    按gv.outfmt和gv.compress创建校正结果的输出
+
+    参数:
+        gv: GlobalVars实例，包含全局变量
+        path: container文件路径
+
+    返回:
+        container输出, 压缩文本的线程池输出, 或None (直接写出文本文件)
+    """
+    if gv.outfmt in ("container", "memmap"):
+        if gv.compress:
+            raise ValueError("压缩输出只支持text格式")
+        return SmContainerWriter(path, gv.dtype)
+    if gv.outfmt != "text":
+        raise ValueError(f"不支持的输出格式: {gv.outfmt}")
+    if gv.compress:
+        return SmBlcWriter(gv.outdir, gv.compress, gv.complevel)
+    return None
+
+
+def smwritecoseis(const: Constants, gv: GlobalVars, av: AllocatableVars) -> int:
+    """
+    输出所有有效台站的同震位移
+
+    参数:
+        const: Constants实例，包含常量
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例，包含可分配变量
+
+    返回:
+        int: 有效台站数量
+    """
+    # 保存同震位移结果
+    with open(gv.coseis, "w") as f:
+        f.write(
+            "   Station  Lat[deg]  Lon[deg] Epdis[km]   East[m]  "
+            "North[m]     Up[m]   RbserrE   RbserrN   RbserrU\n"
+        )
+
+        valid_stations = 0
+        for ist in range(gv.nst):
+            if av.okay[ist]:
+                valid_stations += 1
                 f.write(
-                    "        Time          VdatE          VdatN          VdatZ"
-                    "         BlerrE         BlerrN         BlerrZ"
-                    "      VelocityE      VelocityN      VelocityZ"
-                    "  DisplacementE  DisplacementN  DisplacementZ\n"
+                    f"{av.stcode[ist]:10} {av.lat[ist]:8.4f}"
+                    f" {av.lon[ist]:8.4f}"
+                    f" {av.epidis[ist]/const.KM2M:8.3f}"
+                    f" {av.offset[0,ist]:8.3f} {av.offset[1,ist]:8.3f}"
+                    f" {av.offset[2,ist]:8.3f}"
+                    f" {av.rbserr[0,ist]:8.4f} {av.rbserr[1,ist]:8.4f}"
+                    f" {av.rbserr[2,ist]:8.4f}\n"
                 )
 
-                for i in range(nwin):
-                    time = av.start[ist] + i * gv.dt
-                    vdat = av.vel[i] + av.err[i]
-                    f.write(f"{time:12.3f}")
-                    f.write("".join(f"{v:15.7E}" for v in vdat))
-                    f.write("".join(f"{e:15.7E}" for e in av.err[i]))
-                    f.write("".join(f"{v:15.7E}" for v in av.vel[i]))
-                    f.write("".join(f"{d:15.7E}" for d in av.dis[i]))
-                    f.write("\n")
+    return valid_stations
 
-        # 保存同震位移结果
-        with open(gv.coseis, "w") as f:
-            f.write(
-                "   Station  Lat[deg]  Lon[deg] Epdis[km]   East[m]  "
-                "North[m]     Up[m]   RbserrE   RbserrN   RbserrU\n"
-            )
 
-            valid_stations = 0
+def smgetout(const: Constants, gv: GlobalVars, av: AllocatableVars) -> bool:
+    """
+    读取强震动数据并进行基线校正
+
+    参数:
+        const: Constants实例，包含常量
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例，包含可分配变量
+
+    返回:
+        bool: 是否成功
+    """
+    log.info(" 读取强震动数据...")
+    log.info(" 进行基线校正...")
+
+    log.debug(
+        "   Station  Lat[deg]  Lon[deg] Epdis[km]   East[m]  North[m]     Up[m]"
+        "   RbserrE   RbserrN   RbserrU"
+    )
+
+    try:
+        setbackend(gv.backend)
+        cache = SmCache(gv.cachedir) if gv.cachedir else None
+
+        store = smstore(gv, os.path.join(gv.outdir, SMC_FILE))
+        report = []
+        smprogress(gv.nst)
+        try:
             for ist in range(gv.nst):
-                if av.okay[ist]:
-                    valid_stations += 1
-                    f.write(
-                        f"{av.stcode[ist]:10} {av.lat[ist]:8.4f}"
-                        f" {av.lon[ist]:8.4f}"
-                        f" {av.epidis[ist]/const.KM2M:8.3f}"
-                        f" {av.offset[0,ist]:8.3f} {av.offset[1,ist]:8.3f}"
-                        f" {av.offset[2,ist]:8.3f}"
-                        f" {av.rbserr[0,ist]:8.4f} {av.rbserr[1,ist]:8.4f}"
-                        f" {av.rbserr[2,ist]:8.4f}\n"
-                    )
+                smgetsta(const, gv, av, ist, cache, report, store)
+            if store is not None:
+                store.close()
+        except BaseException:
+            # 失败或中断时不留下不完整的输出
+            if store is not None:
+                store.abort()
+            raise
+        finally:
+            smprogressend()
+
+        if gv.qc:
+            smqcwrite(gv, report)
+
+        # 保存同震位移结果
+        valid_stations = smwritecoseis(const, gv, av)
 
         gv.nst = valid_stations
-        print(f" ====== {gv.nst}个台站的基线校正完成 =======")
+        log.info(f" ====== {gv.nst}个台站的基线校正完成 =======")
         return True
 
     except Exception as e:
-        print(f" smgetout出错: {str(e)}")
+        log.error(f" smgetout出错: {str(e)}")
         return False
@@ -0,0 +1,286 @@
+"""
+同震位移场的网格插值
+
+将coseis.dat中各台站的东、北、垂直向同震位移插值到以震中为原点的规则
+网格上(局部北向/东向坐标, 由disazis计算), 用于快速震源反演.
+
+台站位置按边长为搜索半径的二维网格分桶排序 (SmGridIndex). 输出网格按
+tile×tile的块处理, 每块只取包围盒(扩展搜索半径)内的台站计算距离, 因此
+计算量与(网格点数 × 邻近台站数)成正比, 而不是(网格点数 × 全部台站数).
+结果写入.npy格式的内存映射数组, 不需要一次性放入内存.
+
+    nearest: 搜索半径内最近台站的值
+    idw:     反距离加权, 权重 1/d^power 再乘以 1/(rbserr^2 + GRID_ERRFLOOR^2)
+
+用法:
+    python smgrid.py <输入文件> [半宽(km)] [网格间距(km)] [idw|nearest]
+"""
+
+import json
+import os
+import sys
+from typing import Tuple
+import numpy as np
+import numpy.typing as npt
+from disazi import disazis
+from smalloc import Constants, GlobalVars, AllocatableVars
+from smgetinp import smgetinp
+from smlog import log, smloginit, smlogstop
+
+GRID_ERRFLOOR = 0.005  # rbserr权重的下限(m), 避免rbserr为0时权重无穷大
+GRID_MINDIS = 1.0  # 反距离权重的最小距离(m)
+GRID_TILE = 128  # 每块的网格点数 (每个方向)
+
+
+class SmGridIndex:
+    """台站平面位置的二维网格索引"""
+
+    def __init__(
+        self,
+        north: npt.NDArray[np.float64],
+        east: npt.NDArray[np.float64],
+        cell: float,
+    ):
+        """
+        参数:
+            north, east: 台站相对于震中的北向和东向距离(m)
+            cell: 网格边长(m), 一般取搜索半径
+        """
+        self.north = north
+        self.east = east
+        self.cell = cell
+        self.y0 = float(np.min(north)) if len(north) else 0.0
+        self.x0 = float(np.min(east)) if len(east) else 0.0
+        self.y1 = float(np.max(north)) if len(north) else 0.0
+        self.x1 = float(np.max(east)) if len(east) else 0.0
+        iy, ix = self._cellof(north, east)
+        self.nx = int(np.max(ix)) + 1 if len(ix) else 1
+        self.ny = int(np.max(iy)) + 1 if len(iy) else 1
+        keys = iy * self.nx + ix
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def _cellof(self, y, x) -> Tuple[np.ndarray, np.ndarray]:
+        iy = np.floor((np.asarray(y) - self.y0) / self.cell).astype(np.int64)
+        ix = np.floor((np.asarray(x) - self.x0) / self.cell).astype(np.int64)
+        return iy, ix
+
+    def box(
+        self, ymin: float, ymax: float, xmin: float, xmax: float
+    ) -> npt.NDArray[np.int64]:
+        """
+        包围盒内的台站 (可能包含盒外同一网格单元中的台站)
+
+        返回:
+            np.ndarray: 台站索引
+        """
+        ymin, ymax = max(ymin, self.y0), min(ymax, self.y1)
+        xmin, xmax = max(xmin, self.x0), min(xmax, self.x1)
+        if ymin > ymax or xmin > xmax:
+            return np.zeros(0, dtype=np.int64)
+        iy0, ix0 = self._cellof(ymin, xmin)
+        iy1, ix1 = self._cellof(ymax, xmax)
+        iy0, ix0 = max(int(iy0), 0), max(int(ix0), 0)
+        iy1, ix1 = min(int(iy1), self.ny - 1), min(int(ix1), self.nx - 1)
+        if iy0 > iy1 or ix0 > ix1:
+            return np.zeros(0, dtype=np.int64)
+
+        # 每一行网格单元对应排序键中的一个连续区间
+        rows = np.arange(iy0, iy1 + 1)
+        i0 = np.searchsorted(self.keys, rows * self.nx + ix0, side="left")
+        i1 = np.searchsorted(self.keys, rows * self.nx + ix1, side="right")
+        spans = [self.order[a:b] for a, b in zip(i0, i1) if b > a]
+        return np.concatenate(spans) if spans else np.zeros(0, dtype=np.int64)
+
+
+def smgrid(
+    north: npt.NDArray[np.float64],
+    east: npt.NDArray[np.float64],
+    offset: npt.NDArray[np.float64],
+    rbserr: npt.NDArray[np.float64],
+    yaxis: npt.NDArray[np.float64],
+    xaxis: npt.NDArray[np.float64],
+    outfile: str,
+    method: str = "idw",
+    radius: float = 50.0e3,
+    power: float = 2.0,
+    dtype: str = "float32",
+) -> np.memmap:
+    """
+    将台站同震位移插值到规则网格
+
+    参数:
+        north, east: (n,) 台站相对于震中的北向和东向距离(m)
+        offset: (3 x n) 同震位移 (东, 北, 垂直, m)
+        rbserr: (3 x n) 基线校正误差(m)
+        yaxis, xaxis: 网格的北向和东向坐标(m)
+        outfile: 输出文件 (.npy, 内存映射)
+        method: "idw"或"nearest"
+        radius: 搜索半径(m), 半径内没有台站的网格点为NaN
+        power: 反距离权重的幂次
+        dtype: 输出精度
+
+    返回:
+        np.memmap: (len(yaxis) x len(xaxis) x 3) 位移场
+    """
+    if method not in ("idw", "nearest"):
+        raise ValueError(f"不支持的插值方法: {method}")
+    ny, nx = len(yaxis), len(xaxis)
+    out = np.lib.format.open_memmap(outfile, mode="w+", dtype=dtype, shape=(ny, nx, 3))
+    extent = float(np.ptp(north) + np.ptp(east)) + 1.0 if len(north) else 1.0
+    index = SmGridIndex(north, east, radius if np.isfinite(radius) else extent)
+    werr = 1.0 / (rbserr**2 + GRID_ERRFLOOR**2)  # (3 x n)
+
+    for iy0 in range(0, ny, GRID_TILE):
+        ys = yaxis[iy0 : iy0 + GRID_TILE]
+        for ix0 in range(0, nx, GRID_TILE):
+            xs = xaxis[ix0 : ix0 + GRID_TILE]
+            tile = out[iy0 : iy0 + len(ys), ix0 : ix0 + len(xs)]
+            cand = index.box(
+                float(np.min(ys)) - radius,
+                float(np.max(ys)) + radius,
+                float(np.min(xs)) - radius,
+                float(np.max(xs)) + radius,
+            )
+            if len(cand) == 0:
+                tile[:] = np.nan
+                continue
+
+            # (tile点数 x 候选台站数)的距离
+            gy, gx = np.meshgrid(ys, xs, indexing="ij")
+            d = np.hypot(
+                gy.reshape(-1, 1) - north[cand], gx.reshape(-1, 1) - east[cand]
+            )
+            inside = d <= radius
+            found = np.any(inside, axis=1)
+
+            if method == "nearest":
+                d = np.where(inside, d, np.inf)
+                near = cand[np.argmin(d, axis=1)]
+                field = offset[:, near].T
+            else:
+                wdis = np.where(inside, 1.0 / np.maximum(d, GRID_MINDIS) ** power, 0.0)
+                field = np.empty((len(d), 3))
+                for j in range(3):
+                    w = wdis * werr[j, cand]
+                    wsum = np.sum(w, axis=1)
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        field[:, j] = (w @ offset[j, cand]) / wsum
+
+            field[~found] = np.nan
+            tile[:] = field.reshape(len(ys), len(xs), 3)
+
+    out.flush()
+    return out
+
+
+def smreadcoseis(
+    path: str,
+) -> Tuple[list, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    读取coseis.dat
+
+    返回:
+        (台站代码, 纬度, 经度, offset(3 x n), rbserr(3 x n))
+    """
+    codes = []
+    rows = []
+    with open(path, "r") as f:
+        f.readline()
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 10:
+                codes.append(parts[0])
+                rows.append(parts[1:10])
+    values = np.array(rows, dtype=np.float64).reshape(-1, 9)
+    return codes, values[:, 0], values[:, 1], values[:, 3:6].T, values[:, 6:9].T
+
+
+def smgridout(
+    const: Constants,
+    gv: GlobalVars,
+    av: AllocatableVars,
+    halfwidth: float,
+    spacing: float,
+    method: str = "idw",
+    radius: float = 50.0e3,
+) -> np.memmap:
+    """
+    将coseis.dat插值到以震中为中心的正方形网格, 写出gv.outdir/grid.npy
+
+    参数:
+        const: Constants实例，包含常量
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例 (未使用, 台站结果从coseis.dat读取)
+        halfwidth: 网格半宽(m)
+        spacing: 网格间距(m)
+        method: "idw"或"nearest"
+        radius: 搜索半径(m)
+
+    返回:
+        np.memmap: (ny x nx x 3) 位移场
+    """
+    codes, lat, lon, offset, rbserr = smreadcoseis(gv.coseis)
+    if not codes:
+        raise ValueError(f"{gv.coseis} 中没有台站")
+    north, east = disazis(const.REARTH, gv.hyplat, gv.hyplon, lat, lon)
+
+    axis = np.arange(-halfwidth, halfwidth + 0.5 * spacing, spacing)
+    outfile = os.path.join(gv.outdir, "grid.npy")
+    field = smgrid(
+        north, east, offset, rbserr, axis, axis, outfile, method=method, radius=radius
+    )
+
+    # 网格说明
+    with open(os.path.join(gv.outdir, "grid.json"), "w") as f:
+        json.dump(
+            {
+                "file": "grid.npy",
+                "hypocentre": [gv.hyplat, gv.hyplon],
+                "north": [float(axis[0]), float(axis[-1]), len(axis)],
+                "east": [float(axis[0]), float(axis[-1]), len(axis)],
+                "components": ["East", "North", "Up"],
+                "method": method,
+                "radius": radius,
+                "stations": len(codes),
+            },
+            f,
+            indent=2,
+        )
+    return field
+
+
+def main():
+    """
+    位移场插值入口
+    """
+    try:
+        input_file = "smblc20230206_turkey_M77.inp"
+        if len(sys.argv) > 1:
+            input_file = sys.argv[1]
+        halfwidth = float(sys.argv[2]) if len(sys.argv) > 2 else 200.0
+        spacing = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+        method = sys.argv[4] if len(sys.argv) > 4 else "idw"
+
+        smloginit()
+        const, gv, av, success = smgetinp(input_file)
+        if not success:
+            raise ValueError("Failed to read input file")
+        smloginit(os.path.join(gv.outdir, "smblc.jsonl"))
+
+        field = smgridout(
+            const, gv, av, halfwidth * const.KM2M, spacing * const.KM2M, method
+        )
+        log.info(f" 位移场网格: {field.shape[0]} x {field.shape[1]}")
+        return 0
+
+    except Exception as e:
+        log.error(f"Error: {str(e)}")
+        return 1
+
+    finally:
+        smlogstop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,373 @@
+"""
+计算内核后端模块
+
+rampfit, d2dfit, bscmono和smbscw中难以向量化的递推循环集中在这里实现,
+并提供两个可切换的后端:
+    numpy: 向量化的NumPy实现 (默认, 无额外依赖)
+    numba: 以numba即时编译的逐点循环实现 (需安装numba)
+编译结果通过numba的cache=True缓存到磁盘, 切换到numba后端时用小数组
+预热, 避免首次调用时的编译延迟落在处理流程中.
+
+用法:
+    from smkernel import setbackend
+    setbackend("auto")  # 有numba时使用numba, 否则回退到numpy
+
+各后端与逐点循环参考实现的一致性检查见test_smkernel.py.
+"""
+
+from typing import Callable, Dict, Tuple
+import numpy as np
+import numpy.typing as npt
+
+try:
+    import numba
+except ImportError:  # numba为可选依赖
+    numba = None
+
+
+# ---------------------------------------------------------------------------
+# 逐点循环实现 (numba后端的源代码, 同时作为一致性检查的参考实现)
+# ---------------------------------------------------------------------------
+
+
+def _cumint_loop(x, dt, out):
+    """矩形积分: out[0]=0, out[i]=out[i-1]+x[i]*dt (以float64累加)"""
+    s = 0.0
+    out[0] = 0.0
+    for i in range(1, len(x)):
+        s += x[i] * dt
+        out[i] = s
+
+
+def _monofit_loop(vel, beta, ipre, imax, err):
+    """单调权重加权的基线偏移和校正误差"""
+    ndat = len(beta)
+    mono = np.zeros(ndat)
+    cumbeta = 0.0
+    offset = 0.0
+    count = 0.0
+    for i in range(ndat):
+        cumbeta += beta[i]
+        if i < imax:
+            mono[i] = min(1.0, max(0.0, cumbeta))
+        else:
+            mono[i] = min(1.0, max(0.0, 2.0 - cumbeta))
+        if mono[i] > 0:
+            offset += vel[i + ipre] * mono[i]
+            count += mono[i]
+
+    rbserr = 0.0
+    if count > 0:
+        offset /= count
+        for i in range(ndat):
+            if mono[i] > 0:
+                e = vel[i + ipre] - offset
+                err[i + ipre] = e
+                rbserr += e * e * mono[i]
+        rbserr = np.sqrt(rbserr / count)
+    else:
+        offset = 0.0
+    return offset, rbserr, count
+
+
+def _legendre_loop(n, ndeg, p):
+    """区间[-1,1]上等间距点的勒让德多项式值"""
+    dx = 2.0 / float(n - 1)
+    for i in range(n):
+        x = -1.0 + float(i) * dx
+        p[i, 0] = 1.0
+        if ndeg > 0:
+            p[i, 1] = x
+            for ideg in range(2, ndeg + 1):
+                p[i, ideg] = (
+                    (2 * ideg - 1) * x * p[i, ideg - 1] - (ideg - 1) * p[i, ideg - 2]
+                ) / float(ideg)
+
+
+def _rampsearch_loop(n, n1, n2, swap):
+    """斜坡函数拟合的由粗到细网格搜索"""
+    i2 = n1
+    i1 = i2 - 1
+    y0 = swap[i2, 0] / float(1 + n - i2)
+    smin = -(y0**2) * float(1 + n - i2)
+
+    j1min = n1
+    j1max = n2
+    j2min = n1
+    j2max = n2
+    id = 1 + (n2 - n1) // 50
+
+    while True:
+        for j2 in range(j2min + 1, j2max + 1, id):
+            y0_temp = swap[j2, 0] / float(1 + n - j2)
+            delta = -(y0_temp**2) * float(1 + n - j2)
+
+            for j1 in range(j1min, min(j1max + 1, j2), id):
+                sigma = delta + (
+                    y0_temp * float(j2 - j1 - 1) * float(2 * (j2 - j1) - 1) / 6.0
+                    + 2.0
+                    * (
+                        float(j1 + 1) * (swap[j1, 0] - swap[j2 - 1, 0])
+                        - swap[j2 - 1, 1]
+                        + swap[j1, 1]
+                    )
+                ) * y0_temp / float(j2 - j1)
+
+                if smin > sigma:
+                    i1 = j1
+                    i2 = j2
+                    smin = sigma
+
+        if id > 1:
+            j1min = max(n1, i1 - 5 * id // 2)
+            j1max = min(n2, i1 + 5 * id // 2)
+            j2min = max(n1, i2 - 5 * id // 2)
+            j2max = min(n2, i2 + 5 * id // 2)
+            id = 1 + id // 5
+        else:
+            break
+
+    return i1, i2, smin
+
+
+# ---------------------------------------------------------------------------
+# NumPy向量化实现
+# ---------------------------------------------------------------------------
+
+
+def _cumint_np(x, dt, out):
+    out[0] = 0.0
+    out[1 : len(x)] = np.cumsum(np.multiply(x[1:], dt, dtype=np.float64))
+
+
+def _monofit_np(vel, beta, ipre, imax, err):
+    ndat = len(beta)
+    cumbeta = np.cumsum(beta)
+    mono = np.where(
+        np.arange(ndat) < imax,
+        np.clip(cumbeta, 0.0, 1.0),
+        np.clip(2.0 - cumbeta, 0.0, 1.0),
+    )
+    pos = mono > 0
+    v = np.asarray(vel[ipre : ipre + ndat], dtype=np.float64)[pos]
+    count = float(np.sum(mono[pos]))
+    if count > 0:
+        offset = float(np.sum(v * mono[pos])) / count
+        e = v - offset
+        err[ipre : ipre + ndat][pos] = e
+        rbserr = float(np.sqrt(np.sum(e**2 * mono[pos]) / count))
+    else:
+        offset = 0.0
+        rbserr = 0.0
+    return offset, rbserr, count
+
+
+def _legendre_np(n, ndeg, p):
+    dx = 2.0 / float(n - 1)
+    x = -1.0 + np.arange(n, dtype=np.float64) * dx
+    p[:n, 0] = 1.0
+    if ndeg > 0:
+        p[:n, 1] = x
+        for ideg in range(2, ndeg + 1):
+            p[:n, ideg] = (
+                (2 * ideg - 1) * x * p[:n, ideg - 1] - (ideg - 1) * p[:n, ideg - 2]
+            ) / float(ideg)
+
+
+def _rampsearch_np(n, n1, n2, swap):
+    i2 = n1
+    i1 = i2 - 1
+    y0 = swap[i2, 0] / float(1 + n - i2)
+    smin = -(y0**2) * float(1 + n - i2)
+
+    j1min = n1
+    j1max = n2
+    j2min = n1
+    j2max = n2
+    id = 1 + (n2 - n1) // 50
+
+    while True:
+        # 整个(j2, j1)网格一次计算, 按j2优先顺序取第一个最小值
+        j2 = np.arange(j2min + 1, j2max + 1, id)[:, None]
+        j1 = np.arange(j1min, j1max + 1, id)[None, :]
+        if j2.size > 0 and j1.size > 0:
+            y0_temp = swap[j2, 0] / (1.0 + n - j2)
+            delta = -(y0_temp**2) * (1.0 + n - j2)
+            valid = j1 < j2
+            j1c = np.where(valid, j1, 0)
+            width = np.where(valid, j2 - j1, 1)
+            sigma = delta + (
+                y0_temp * (width - 1.0) * (2.0 * width - 1.0) / 6.0
+                + 2.0
+                * (
+                    (j1c + 1.0) * (swap[j1c, 0] - swap[j2 - 1, 0])
+                    - swap[j2 - 1, 1]
+                    + swap[j1c, 1]
+                )
+            ) * y0_temp / width
+            sigma = np.where(valid, sigma, np.inf)
+            k = int(np.argmin(sigma))
+            r, c = divmod(k, sigma.shape[1])
+            if smin > sigma[r, c]:
+                i1 = int(j1[0, c])
+                i2 = int(j2[r, 0])
+                smin = float(sigma[r, c])
+
+        if id > 1:
+            j1min = max(n1, i1 - 5 * id // 2)
+            j1max = min(n2, i1 + 5 * id // 2)
+            j2min = max(n1, i2 - 5 * id // 2)
+            j2max = min(n2, i2 + 5 * id // 2)
+            id = 1 + id // 5
+        else:
+            break
+
+    return i1, i2, smin
+
+
+# ---------------------------------------------------------------------------
+# 后端选择
+# ---------------------------------------------------------------------------
+
+_LOOPS: Dict[str, Callable] = {
+    "cumint": _cumint_loop,
+    "monofit": _monofit_loop,
+    "legendre": _legendre_loop,
+    "rampsearch": _rampsearch_loop,
+}
+_NUMPY: Dict[str, Callable] = {
+    "cumint": _cumint_np,
+    "monofit": _monofit_np,
+    "legendre": _legendre_np,
+    "rampsearch": _rampsearch_np,
+}
+_JIT: Dict[str, Callable] = {}  # 已编译的numba内核 (进程内只编译一次)
+_impl: Dict[str, Callable] = dict(_NUMPY)
+_backend = "numpy"
+
+
+def _warmup(kernels: Dict[str, Callable]):
+    """
+    用小数组调用各内核, 触发编译(或读取磁盘上的编译缓存)
+
+    时间序列按gv.dtype存储, float64和float32两种签名都要编译,
+    否则float32模式下第一个台站才触发编译.
+    """
+    x = np.linspace(0.0, 1.0, 8)
+    for dtype in (np.float64, np.float32):
+        xs = x.astype(dtype)
+        out = np.zeros(8, dtype=dtype)
+        kernels["cumint"](xs, 0.1, out)
+        kernels["monofit"](xs, x[2:6] - 0.5, 2, 1, out)
+
+        # smbscw和bscmono以(nwin x 3)数组的列(非连续视图)调用
+        buf = np.zeros((8, 3), dtype=dtype)
+        kernels["cumint"](buf[:, 0], 0.1, buf[:, 1])
+        kernels["monofit"](buf[:, 1], x[2:6] - 0.5, 2, 1, buf[:, 2])
+    kernels["legendre"](8, 3, np.zeros((8, 4)))
+    kernels["rampsearch"](8, 1, 6, np.ones((8, 2)))
+
+
+def setbackend(name: str = "auto") -> str:
+    """
+    选择计算内核后端
+
+    参数:
+        name: "numpy", "numba" 或 "auto" (有numba时使用numba)
+
+    返回:
+        str: 实际使用的后端名
+    """
+    global _backend
+    if name == "auto":
+        name = "numba" if numba is not None else "numpy"
+
+    if name == "numpy":
+        _impl.update(_NUMPY)
+    elif name == "numba":
+        if numba is None:
+            raise ValueError("未安装numba, 无法使用numba后端")
+        if not _JIT:
+            jit = {k: numba.njit(cache=True)(f) for k, f in _LOOPS.items()}
+            _warmup(jit)
+            _JIT.update(jit)
+        _impl.update(_JIT)
+    else:
+        raise ValueError(f"未知的计算内核后端: {name}")
+
+    _backend = name
+    return name
+
+
+def getbackend() -> str:
+    """当前使用的计算内核后端"""
+    return _backend
+
+
+def cumint(
+    x: npt.NDArray[np.float64], dt: float, out: npt.NDArray[np.float64]
+) -> None:
+    """
+    矩形积分 out[0]=0, out[i]=out[i-1]+x[i]*dt (用于速度和位移积分)
+
+    参数说明:
+    x: array, 被积序列
+    dt: float, 采样时间间隔
+    out: array, 输出数组 (长度不小于len(x))
+    """
+    _impl["cumint"](x, dt, out)
+
+
+def monofit(
+    vel: npt.NDArray[np.float64],
+    beta: npt.NDArray[np.float64],
+    ipre: int,
+    imax: int,
+    err: npt.NDArray[np.float64],
+) -> Tuple[float, float, float]:
+    """
+    单调基线校正的核心循环 (见bscmono)
+
+    参数说明:
+    vel: array, 速度记录
+    beta: array, 信号窗口内归一化的速度变化率
+    ipre: int, 预事件窗口终点
+    imax: int, 最大变化率在信号窗口内的位置
+    err: array, 误差记录 (信号窗口内被更新)
+
+    返回值:
+    offset, rbserr, count: 基线偏移值、校正误差和单调权重之和
+    """
+    offset, rbserr, count = _impl["monofit"](vel, beta, ipre, imax, err)
+    return float(offset), float(rbserr), float(count)
+
+
+def legendre(n: int, ndeg: int, p: npt.NDArray[np.float64]) -> None:
+    """
+    计算[-1,1]上n个等间距点的0~ndeg阶勒让德多项式值 (见d2dfit)
+
+    参数说明:
+    n: int, 数据点数量
+    ndeg: int, 多项式次数
+    p: array, 输出矩阵 (n x (ndeg+1))
+    """
+    _impl["legendre"](n, ndeg, p)
+
+
+def rampsearch(
+    n: int, n1: int, n2: int, swap: npt.NDArray[np.float64]
+) -> Tuple[int, int, float]:
+    """
+    斜坡函数拟合的网格搜索 (见rampfit)
+
+    参数说明:
+    n: int, 数据长度
+    n1: int, 起始点索引
+    n2: int, 结束点索引
+    swap: array, rampfit中计算好的累加和 (n x 2)
+
+    返回值:
+    i1, i2, smin: 最优斜坡起止点及对应的误差(不含sum(y**2))
+    """
+    i1, i2, smin = _impl["rampsearch"](n, n1, n2, swap)
+    return int(i1), int(i2), float(smin)
@@ -0,0 +1,307 @@
+"""
+分级、带缓冲的结构化日志
+
+所有模块通过 log = logging.getLogger("smblc") 输出信息. 未调用smloginit时
+只有一个写到标准输出的简单处理器 (INFO级别, 只输出消息本身).
+
+smloginit之后, 日志记录先放入一个多进程队列(QueueHandler), 由后台线程
+(QueueListener)写到终端和JSON Lines文件, 处理台站的进程和工作进程不会
+因终端I/O而阻塞; JSON Lines文件的写入按SMLOG_BUFFER条记录成批进行.
+记录中通过extra传入的字段 (如station, offset) 原样写入JSON.
+
+逐台站的结果为DEBUG级别, 并带有station/okay/reason字段. 终端默认只显示
+SmProgress根据这些记录定期给出的进度汇总 (已完成台站数、台站/s、预计剩余
+时间及各原因的拒绝数); 队列化时SmProgress在后台线程中统计, 因此也包括
+工作进程的台站. smsched的工作进程用smlogcapture暂存台站记录, 由调度进程
+按震中距顺序输出, 与串行处理的顺序相同.
+"""
+
+import json
+import logging
+import logging.handlers
+import math
+import multiprocessing as mp
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+SMLOG_NAME = "smblc"
+SMLOG_BUFFER = 512  # JSON Lines文件的批量写入记录数
+
+log = logging.getLogger(SMLOG_NAME)
+log.setLevel(logging.DEBUG)
+log.propagate = False
+
+# LogRecord的标准属性, 其余属性视为extra字段
+_STANDARD = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {
+    "message",
+    "asctime",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录格式化为一行JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "process": record.process,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD and not key.startswith("_"):
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=float)
+
+
+def _notprogressend(record: logging.LogRecord) -> bool:
+    """JSON Lines文件不记录smprogressend的内部结束信号"""
+    return not getattr(record, "progress_end", False)
+
+
+def _console(level: int) -> logging.Handler:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setLevel(level)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    return handler
+
+
+class _Relay(logging.Handler):
+    """
+    后台线程中的转发处理器: 把记录交给当前的SmProgress
+
+    QueueListener.handlers在后台线程中被遍历, 不能在运行中替换;
+    SmProgress的增减改为在本处理器的锁内修改targets.
+    """
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.targets: List[logging.Handler] = []
+
+    def emit(self, record: logging.LogRecord):
+        for handler in self.targets:
+            handler.handle(record)
+
+    def add(self, handler: logging.Handler):
+        """加入一个处理器, 同时移除已结束的SmProgress"""
+        self.acquire()
+        try:
+            self.targets = [
+                h for h in self.targets if not getattr(h, "finished", False)
+            ] + [handler]
+        finally:
+            self.release()
+
+
+class _Capture(logging.handlers.QueueHandler):
+    """把记录(按QueueHandler的方式处理为可pickle)暂存在列表中"""
+
+    def __init__(self):
+        super().__init__(None)
+        self.records: List[logging.LogRecord] = []
+
+    def enqueue(self, record: logging.LogRecord):
+        self.records.append(record)
+
+
+# 默认: 直接写到标准输出
+log.addHandler(_console(logging.INFO))
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_relay: Optional[_Relay] = None
+_queue = None
+
+
+def smloginit(jsonfile: str = "", level: int = logging.INFO):
+    """
+    启用队列化的日志输出 (可重复调用, 例如在确定输出目录后加入JSON文件)
+
+    参数:
+        jsonfile: JSON Lines日志文件, 空表示不写文件 (文件中包含DEBUG级别)
+        level: 终端的日志级别
+    """
+    global _listener, _relay, _queue
+    smlogstop()
+
+    _relay = _Relay()
+    handlers = [_console(level), _relay]
+    if jsonfile:
+        target = logging.FileHandler(jsonfile, mode="a", encoding="utf-8")
+        target.setFormatter(JsonFormatter())
+        buffer = logging.handlers.MemoryHandler(
+            SMLOG_BUFFER, flushLevel=logging.ERROR, target=target
+        )
+        buffer.addFilter(_notprogressend)
+        handlers.append(buffer)
+
+    _queue = mp.Queue(-1)
+    _listener = logging.handlers.QueueListener(
+        _queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+    smlogattach(_queue)
+
+
+def smlogqueue():
+    """当前的日志队列 (传给工作进程的smlogattach), 未启用时为None"""
+    return _queue
+
+
+def smlogattach(queue):
+    """
+    工作进程: 将日志记录送入调度进程的日志队列
+
+    参数:
+        queue: smlogqueue()的返回值, None时保持默认输出
+    """
+    if queue is None:
+        return
+    for handler in list(log.handlers):
+        log.removeHandler(handler)
+    log.addHandler(logging.handlers.QueueHandler(queue))
+
+
+@contextmanager
+def smlogcapture():
+    """
+    暂存本进程的日志记录而不输出 (smsched的工作进程按台站收集记录,
+    交给调度进程按震中距顺序用log.handle输出)
+
+    返回:
+        List[logging.LogRecord]: with块中产生的记录 (可pickle)
+    """
+    capture = _Capture()
+    saved = list(log.handlers)
+    for handler in saved:
+        log.removeHandler(handler)
+    log.addHandler(capture)
+    try:
+        yield capture.records
+    finally:
+        log.removeHandler(capture)
+        for handler in saved:
+            log.addHandler(handler)
+
+
+def smlogstop():
+    """停止后台线程并写出缓冲的记录, 恢复默认输出"""
+    global _listener, _relay, _queue
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        target = getattr(handler, "target", None)
+        handler.close()
+        if target is not None:
+            target.close()
+    _listener = None
+    _relay = None
+    _queue = None
+    for handler in list(log.handlers):
+        log.removeHandler(handler)
+    log.addHandler(_console(logging.INFO))
+
+
+class SmProgress(logging.Handler):
+    """统计带okay字段的台站记录, 定期输出处理进度和预计剩余时间"""
+
+    def __init__(self, total: int, interval: float = 10.0):
+        """
+        参数:
+            total: 台站总数
+            interval: 汇总输出的最短间隔(s)
+        """
+        super().__init__(logging.DEBUG)
+        self.sink = log.handle  # 汇总记录的去向 (队列化时直接交给后台线程的处理器)
+        self.finished = False
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.rejected: Dict[str, int] = {}
+        self.t0 = time.monotonic()
+        self.last = self.t0
+
+    def emit(self, record: logging.LogRecord):
+        if self.finished:
+            return
+        if getattr(record, "progress_end", False):
+            self.finished = True
+            self.report(final=True)
+            return
+        okay = getattr(record, "okay", None)
+        if okay is not None:
+            self.update(bool(okay), getattr(record, "reason", ""))
+
+    def update(self, okay: bool, reason: str = ""):
+        """
+        记录一个台站处理完成
+
+        参数:
+            okay: 是否得到有效结果
+            reason: 未得到有效结果的原因
+        """
+        self.done += 1
+        if not okay:
+            key = reason or "other"
+            self.rejected[key] = self.rejected.get(key, 0) + 1
+        now = time.monotonic()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.report()
+
+    def report(self, final: bool = False):
+        """输出一条进度汇总"""
+        elapsed = max(time.monotonic() - self.t0, 1.0e-9)
+        rate = self.done / elapsed
+        eta = (self.total - self.done) / rate if rate > 0 else float("inf")
+        nrej = sum(self.rejected.values())
+        detail = ", ".join(f"{k}: {v}" for k, v in sorted(self.rejected.items()))
+        text = (
+            f" 进度: {self.done}/{self.total} 台站, {rate:.2f} 台站/s,"
+            f" 拒绝 {nrej}" + (f" ({detail})" if detail else "")
+        )
+        if final:
+            text += f", 用时 {elapsed:.1f} s"
+        else:
+            text += f", 预计剩余 {eta:.0f} s"
+        extra = {
+            "done": self.done,
+            "total": self.total,
+            "rate": rate,
+            "eta": None if final or not math.isfinite(eta) else eta,
+            "rejected": dict(self.rejected),
+        }
+        record = log.makeRecord(
+            log.name, logging.INFO, __file__, 0, text, (), None, extra=extra
+        )
+        self.sink(record)
+
+
+def smprogress(total: int, interval: float = 10.0) -> SmProgress:
+    """
+    开始统计一次处理的进度
+
+    参数:
+        total: 台站总数
+        interval: 汇总输出的最短间隔(s)
+
+    返回:
+        SmProgress: 进度统计 (队列化时在后台线程中接收记录)
+    """
+    progress = SmProgress(total, interval)
+    if _listener is not None:
+        progress.sink = _listener.handle
+        _relay.add(progress)
+    else:
+        for handler in list(log.handlers):
+            if getattr(handler, "finished", False):
+                log.removeHandler(handler)
+        log.addHandler(progress)
+    return progress
+
+
+def smprogressend():
+    """输出最终的进度汇总 (在此之前的台站记录都已被统计)"""
+    log.debug("", extra={"progress_end": True})
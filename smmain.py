@@ -1,41 +1,77 @@
+import argparse
+import os
 import sys
 from smgetinp import smgetinp
 from smgetout import smgetout
+from smlog import log, smloginit, smlogstop
 from smalloc import Constants, GlobalVars, AllocatableVars
 
 
+def smargs(argv=None) -> argparse.Namespace:
+    """
+    解析命令行参数 (设置项覆盖输入文件末尾的设置块, 见smgetinp)
+
+    参数:
+        argv: 命令行参数, None表示sys.argv[1:]
+
+    返回:
+        argparse.Namespace: input_file及设置项 (未给出的设置项为None)
+    """
+    parser = argparse.ArgumentParser(
+        description="smblc2023: 强震动记录的基线校正和同震位移"
+    )
+    parser.add_argument("input_file", nargs="?", default="smblc20230206_turkey_M77.inp")
+    parser.add_argument("--cachedir", help="中间结果缓存目录")
+    parser.add_argument("--backend", choices=("numpy", "numba", "auto"))
+    parser.add_argument("--dtype", choices=("float64", "float32"))
+    parser.add_argument(
+        "--qc", action=argparse.BooleanOptionalAction, help="基线校正前的快速质量检查"
+    )
+    parser.add_argument("--outfmt", choices=("text", "container", "memmap"))
+    parser.add_argument("--compress", choices=("gzip", "bz2", "xz"))
+    parser.add_argument("--complevel", type=int)
+    parser.add_argument("--catalog", help="持久化台站目录文件")
+    return parser.parse_args(argv)
+
+
 def main():
     """
     主程序入口
     """
     try:
-        # 获取输入文件名
-        # if len(sys.argv) > 1:
-        #     # 如果通过命令行参数提供输入文件
-        #     input_file = sys.argv[1]
-        # else:
-        #     # 否则通过用户输入获取
-        #     input_file = input("Input file name: ").strip()
-        #     if not input_file:
-        #         raise ValueError("No input file specified")
-        input_file = "smblc20230206_turkey_M77.inp"
+        args = smargs()
+        input_file = args.input_file
+        options = {
+            name: value
+            for name, value in vars(args).items()
+            if name != "input_file" and value is not None
+        }
+        smloginit()
+
         # 读取数据
-        print("Reading data...")
-        const, gv, av, success = smgetinp(input_file)
+        log.info("Reading data...")
+        const, gv, av, success = smgetinp(input_file, options=options)
         if not success:
             raise ValueError("Failed to read input file")
 
+        # 输出目录确定后加入JSON Lines日志
+        smloginit(os.path.join(gv.outdir, "smblc.jsonl"))
+
         # 进行基线校正
-        print("Performing baseline correction...")
-        smgetout(const, gv, av)
+        log.info("Performing baseline correction...")
+        if not smgetout(const, gv, av):
+            return 1
 
-        print("Processing completed successfully")
+        log.info("Processing completed successfully")
         return 0
 
     except Exception as e:
-        print(f"Error: {str(e)}")
+        log.error(f"Error: {str(e)}")
         return 1
 
+    finally:
+        smlogstop()
+
 
 if __name__ == "__main__":
     sys.exit(main())
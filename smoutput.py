@@ -0,0 +1,552 @@
+"""
+校正后时间序列的输出格式
+
+text:      每个台站一个<stcode>_blc.dat文本文件 (原Fortran格式)
+container: 所有台站写入gv.outdir/blc.smc一个二进制文件, 避免在共享文件系统
+           上产生大量小文件
+memmap:    与container格式相同, 但每个台站的数据块先在文件中预留并映射,
+           smbscw的积分结果直接写入映射数组, 没有中间副本和格式化;
+           内存紧张时由操作系统将结果换出到磁盘
+
+text格式可以直接写出压缩文件(gzip/bz2/xz, SmBlcWriter): 格式化和压缩在
+线程池中进行, 与后续台站的校正重叠; 等待写出的台站数量有上限, 内存占用
+可预期.
+
+container文件结构 (小端):
+    0-7    魔数 SMC_MAGIC
+    8-15   uint64 索引的起始位置
+    ...    各台站的数据块, 每块为(nwin x 12)的数组, 列为SMC_COLUMNS,
+           起始位置按SMC_ALIGN字节对齐
+    索引   JSON: 数据类型、列名及每个台站的 code/offset/nwin/start/dt
+
+写入时先写临时文件, close()时写出索引并改名, 因此中断的运行不会留下
+不完整的文件. 读取时只解析索引, 单个台站的数据通过np.memmap按需映射.
+"""
+
+import bz2
+import gzip
+import json
+import lzma
+import os
+import struct
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import numpy.typing as npt
+from smlog import log, smloginit, smlogstop
+
+SMC_FILE = "blc.smc"
+SMC_MAGIC = b"SMBLC\x00\x01\x00"
+SMC_ALIGN = 64
+SMC_COLUMNS = (
+    "VdatE",
+    "VdatN",
+    "VdatZ",
+    "BlerrE",
+    "BlerrN",
+    "BlerrZ",
+    "VelocityE",
+    "VelocityN",
+    "VelocityZ",
+    "DisplacementE",
+    "DisplacementN",
+    "DisplacementZ",
+)
+
+BLC_HEADER = (
+    "        Time          VdatE          VdatN          VdatZ"
+    "         BlerrE         BlerrN         BlerrZ"
+    "      VelocityE      VelocityN      VelocityZ"
+    "  DisplacementE  DisplacementN  DisplacementZ\n"
+)
+
+# 压缩方式 -> (文件后缀, 压缩函数(数据, 级别))
+BLC_COMPRESS: Dict[str, Tuple[str, Callable[[bytes, int], bytes]]] = {
+    "gzip": (".gz", lambda data, level: gzip.compress(data, compresslevel=level)),
+    "bz2": (".bz2", lambda data, level: bz2.compress(data, compresslevel=level)),
+    "xz": (".xz", lambda data, level: lzma.compress(data, preset=level)),
+}
+
+# 压缩方式 -> 允许的压缩级别范围 (bz2不接受0)
+BLC_COMPLEVEL: Dict[str, Tuple[int, int]] = {
+    "gzip": (0, 9),
+    "bz2": (1, 9),
+    "xz": (0, 9),
+}
+
+
+def blccheck(compress: str, level: int):
+    """
+    检查压缩方式和级别 (在处理台站之前调用, 以免在写出线程中才出错)
+
+    参数:
+        compress: 压缩方式 (gzip/bz2/xz)
+        level: 压缩级别
+    """
+    if compress not in BLC_COMPRESS:
+        raise ValueError(f"不支持的压缩方式: {compress}")
+    lo, hi = BLC_COMPLEVEL[compress]
+    if not lo <= level <= hi:
+        raise ValueError(f"{compress}的压缩级别应在{lo}-{hi}之间: {level}")
+
+
+def formatblc(
+    start: float,
+    dt: float,
+    vel: npt.NDArray[np.float64],
+    err: npt.NDArray[np.float64],
+    dis: npt.NDArray[np.float64],
+) -> str:
+    """
+    将一个台站的校正结果格式化为<stcode>_blc.dat的文本
+
+    参数:
+        start: 起始时间(s)
+        dt: 采样间隔(s)
+        vel: (nwin x 3) 校正后的速度
+        err: (nwin x 3) 基线误差
+        dis: (nwin x 3) 位移
+
+    返回:
+        str: 文件内容
+    """
+    lines = [BLC_HEADER]
+    for i in range(len(vel)):
+        time = start + i * dt
+        vdat = vel[i] + err[i]
+        lines.append(f"{time:12.3f}")
+        lines.append("".join(f"{v:15.7E}" for v in vdat))
+        lines.append("".join(f"{e:15.7E}" for e in err[i]))
+        lines.append("".join(f"{v:15.7E}" for v in vel[i]))
+        lines.append("".join(f"{d:15.7E}" for d in dis[i]))
+        lines.append("\n")
+    return "".join(lines)
+
+
+def writeblc(
+    outfile: str,
+    start: float,
+    dt: float,
+    vel: npt.NDArray[np.float64],
+    err: npt.NDArray[np.float64],
+    dis: npt.NDArray[np.float64],
+):
+    """
+    以文本格式写出一个台站的校正结果 (<stcode>_blc.dat)
+
+    参数:
+        outfile: 输出文件路径
+        start: 起始时间(s)
+        dt: 采样间隔(s)
+        vel: (nwin x 3) 校正后的速度
+        err: (nwin x 3) 基线误差
+        dis: (nwin x 3) 位移
+    """
+    with open(outfile, "w") as f:
+        f.write(formatblc(start, dt, vel, err, dis))
+
+
+def _remove(path: str):
+    """删除文件 (不存在时忽略)"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class SmBlcWriter:
+    """在线程池中格式化、压缩并写出<stcode>_blc.dat"""
+
+    def __init__(
+        self,
+        outdir: str,
+        compress: str,
+        level: int = 6,
+        nthread: int = 0,
+        maxpending: int = 0,
+    ):
+        """
+        参数:
+            outdir: 输出目录
+            compress: 压缩方式 (gzip/bz2/xz)
+            level: 压缩级别 (gzip/bz2为1-9, xz为0-9)
+            nthread: 线程数, 0表示min(4, CPU核数)
+            maxpending: 等待写出的台站数量上限, 0表示2*nthread
+        """
+        blccheck(compress, level)
+        self.outdir = outdir
+        self.suffix, self.compressor = BLC_COMPRESS[compress]
+        self.level = level
+        nthread = nthread or min(4, os.cpu_count() or 1)
+        self.pool = ThreadPoolExecutor(max_workers=nthread)
+        self.slots = threading.BoundedSemaphore(maxpending or 2 * nthread)
+        self.futures: List[Future] = []
+
+    def _write(self, outfile: str, start: float, dt: float, vel, err, dis):
+        data = formatblc(start, dt, vel, err, dis).encode("ascii")
+        data = self.compressor(data, self.level)
+        tmp = f"{outfile}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, outfile)
+        except BaseException:
+            _remove(tmp)
+            raise
+
+    def _check(self):
+        """检查已完成的写出, 有错误时抛出"""
+        pending = []
+        for future in self.futures:
+            if future.done():
+                future.result()
+            else:
+                pending.append(future)
+        self.futures = pending
+
+    def append(
+        self,
+        code: str,
+        start: float,
+        dt: float,
+        vel: npt.NDArray[np.float64],
+        err: npt.NDArray[np.float64],
+        dis: npt.NDArray[np.float64],
+    ):
+        """
+        提交一个台站 (等待写出的台站已达上限时阻塞)
+
+        参数:
+            code: 台站代码
+            start: 起始时间(s)
+            dt: 采样间隔(s)
+            vel, err, dis: (nwin x 3) 速度、基线误差和位移 (会被复制)
+        """
+        self._check()
+        self.slots.acquire()
+        outfile = os.path.join(self.outdir, f"{code}_blc.dat{self.suffix}")
+        try:
+            future = self.pool.submit(
+                self._write, outfile, start, dt, vel.copy(), err.copy(), dis.copy()
+            )
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(future)
+
+    def close(self):
+        """等待所有台站写出完成"""
+        self.pool.shutdown(wait=True)
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+
+    def abort(self):
+        """放弃尚未开始的写出 (处理失败或中断时调用, 已写出的台站文件保留)"""
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self.futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class SmContainerWriter:
+    """向container文件追加台站数据"""
+
+    def __init__(self, path: str, dtype: str = "float64"):
+        """
+        参数:
+            path: container文件路径
+            dtype: 数据的存储精度
+        """
+        self.path = path
+        self.dtype = np.dtype(dtype).newbyteorder("<")
+        self.index: Dict[str, Dict] = {}
+        self.reserved: Dict[str, Tuple[int, np.memmap]] = {}
+        self.tmp = f"{path}.{os.getpid()}.tmp"
+        self.f = open(self.tmp, "wb")
+        self.f.write(SMC_MAGIC + struct.pack("<Q", 0))
+
+    def _align(self):
+        pad = -self.f.tell() % SMC_ALIGN
+        if pad:
+            self.f.write(b"\0" * pad)
+
+    def append(
+        self,
+        code: str,
+        start: float,
+        dt: float,
+        vel: npt.NDArray[np.float64],
+        err: npt.NDArray[np.float64],
+        dis: npt.NDArray[np.float64],
+    ):
+        """
+        追加一个台站 (同一台站重复追加时以最后一次为准)
+
+        参数:
+            code: 台站代码
+            start: 起始时间(s)
+            dt: 采样间隔(s)
+            vel, err, dis: (nwin x 3) 速度、基线误差和位移
+        """
+        block = np.empty((len(vel), len(SMC_COLUMNS)), dtype=self.dtype)
+        block[:, 0:3] = vel + err
+        block[:, 3:6] = err
+        block[:, 6:9] = vel
+        block[:, 9:12] = dis
+        self.appendblock(code, start, dt, block)
+
+    def appendblock(
+        self, code: str, start: float, dt: float, block: npt.NDArray[np.float64]
+    ):
+        """追加一个已按SMC_COLUMNS排列的(nwin x 12)数据块"""
+        self._align()
+        offset = self.f.tell()
+        self.f.write(np.ascontiguousarray(block, dtype=self.dtype).tobytes())
+        self.index.pop(code, None)
+        self.index[code] = {
+            "offset": offset,
+            "nwin": len(block),
+            "start": float(start),
+            "dt": float(dt),
+        }
+
+    def reserve(self, code: str, nwin: int) -> np.memmap:
+        """
+        在文件末尾预留一个台站的数据块并映射 (memmap模式)
+
+        参数:
+            code: 台站代码
+            nwin: 数据块的行数
+
+        返回:
+            np.memmap: (nwin x 12) 可写数组, 列为SMC_COLUMNS,
+                填写完成后调用commit
+        """
+        self._align()
+        offset = self.f.tell()
+        size = nwin * len(SMC_COLUMNS) * self.dtype.itemsize
+        self.f.truncate(offset + size)
+        self.f.seek(offset + size)
+        self.f.flush()
+        block = np.memmap(
+            self.tmp,
+            dtype=self.dtype,
+            mode="r+",
+            offset=offset,
+            shape=(nwin, len(SMC_COLUMNS)),
+        )
+        self.reserved[code] = (offset, block)
+        return block
+
+    def commit(self, code: str, start: float, dt: float):
+        """
+        完成一个预留的数据块: 计算Vdat列, 写回磁盘并加入索引
+
+        参数:
+            code: 台站代码
+            start: 起始时间(s)
+            dt: 采样间隔(s)
+        """
+        offset, block = self.reserved.pop(code)
+        np.add(block[:, 6:9], block[:, 3:6], out=block[:, 0:3])
+        block.flush()
+        self.index.pop(code, None)
+        self.index[code] = {
+            "offset": offset,
+            "nwin": len(block),
+            "start": float(start),
+            "dt": float(dt),
+        }
+
+    def close(self):
+        """
+        写出索引并将临时文件改名为正式文件
+
+        只应在所有台站处理成功后调用; 处理失败或中断时调用abort,
+        不完整的文件不会替换正式文件.
+        """
+        if self.f.closed:
+            return
+        try:
+            self._align()
+            where = self.f.tell()
+            index = {
+                "dtype": self.dtype.str,
+                "columns": list(SMC_COLUMNS),
+                "stations": [{"code": code, **ent} for code, ent in self.index.items()],
+            }
+            self.f.write(json.dumps(index).encode("utf-8"))
+            self.f.seek(len(SMC_MAGIC))
+            self.f.write(struct.pack("<Q", where))
+            self.f.close()
+            os.replace(self.tmp, self.path)
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        """关闭并删除临时文件, 正式文件保持不变 (close之后调用无作用)"""
+        self.reserved.clear()
+        if not self.f.closed:
+            self.f.close()
+        _remove(self.tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class SmContainer:
+    """只读访问container文件, 按台站映射数据"""
+
+    def __init__(self, path: str):
+        """
+        参数:
+            path: container文件路径
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            head = f.read(len(SMC_MAGIC) + 8)
+            if head[: len(SMC_MAGIC)] != SMC_MAGIC:
+                raise ValueError(f"不是container文件: {path}")
+            (where,) = struct.unpack("<Q", head[len(SMC_MAGIC) :])
+            f.seek(where)
+            index = json.loads(f.read().decode("utf-8"))
+        self.dtype = np.dtype(index["dtype"])
+        self.columns: List[str] = index["columns"]
+        self.index: Dict[str, Dict] = {ent["code"]: ent for ent in index["stations"]}
+
+    @property
+    def codes(self) -> List[str]:
+        """台站代码 (写入顺序)"""
+        return list(self.index)
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def read(self, code: str) -> np.memmap:
+        """
+        映射一个台站的数据, 不读入其他台站
+
+        返回:
+            np.memmap: (nwin x 12) 只读数组, 列为SMC_COLUMNS
+        """
+        ent = self.index[code]
+        return np.memmap(
+            self.path,
+            dtype=self.dtype,
+            mode="r",
+            offset=ent["offset"],
+            shape=(ent["nwin"], len(self.columns)),
+        )
+
+    def time(self, code: str) -> npt.NDArray[np.float64]:
+        """一个台站的时间序列(s)"""
+        ent = self.index[code]
+        return ent["start"] + ent["dt"] * np.arange(ent["nwin"])
+
+    def column(self, code: str, name: str) -> np.ndarray:
+        """一个台站的一列数据 (如"DisplacementE"), 为memmap视图"""
+        return self.read(code)[:, self.columns.index(name)]
+
+
+def smcmerge(paths: Sequence[str], outfile: str, order: Optional[Sequence[str]] = None):
+    """
+    合并多个container文件 (如多节点处理的各分片结果)
+
+    参数:
+        paths: 输入container文件
+        outfile: 输出container文件
+        order: 台站输出顺序, None表示按输入文件顺序
+    """
+    sources = [SmContainer(path) for path in paths]
+    where = {code: src for src in sources for code in src.codes}
+    codes = [code for code in order if code in where] if order else list(where)
+    dtype = sources[0].dtype if sources else np.dtype("<f8")
+    with SmContainerWriter(outfile, dtype.name) as out:
+        for code in codes:
+            src = where[code]
+            ent = src.index[code]
+            out.appendblock(code, ent["start"], ent["dt"], src.read(code))
+
+
+def smexport(path: str, outdir: str, codes: Optional[Sequence[str]] = None) -> int:
+    """
+    由container文件重新生成经典的<stcode>_blc.dat文本文件
+
+    参数:
+        path: container文件路径
+        outdir: 文本文件的输出目录
+        codes: 要导出的台站, None表示全部
+
+    返回:
+        int: 导出的台站数量
+    """
+    smc = SmContainer(path)
+    os.makedirs(outdir, exist_ok=True)
+    nout = 0
+    for code in codes if codes else smc.codes:
+        if code not in smc:
+            log.warning(
+                f"{code}   ... 不在{path}中 ...",
+                extra={"station": code, "reason": "missing"},
+            )
+            continue
+        ent = smc.index[code]
+        block = smc.read(code)
+        writeblc(
+            os.path.join(outdir, f"{code}_blc.dat"),
+            ent["start"],
+            ent["dt"],
+            block[:, 6:9],
+            block[:, 3:6],
+            block[:, 9:12],
+        )
+        nout += 1
+    return nout
+
+
+def main():
+    """
+    导出入口: python smoutput.py <container文件> [输出目录] [台站代码...]
+    """
+    try:
+        if len(sys.argv) < 2:
+            raise ValueError("usage: smoutput.py <container> [outdir] [station ...]")
+        path = sys.argv[1]
+        outdir = sys.argv[2] if len(sys.argv) > 2 else os.path.dirname(path) or "."
+        os.makedirs(outdir, exist_ok=True)
+        smloginit(os.path.join(outdir, "smblc.jsonl"))
+        nout = smexport(path, outdir, sys.argv[3:])
+        log.info(f" 导出了 {nout} 个台站到 {outdir}")
+        return 0
+
+    except Exception as e:
+        log.error(f"Error: {str(e)}")
+        return 1
+
+    finally:
+        smlogstop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+基线校正前的快速质量检查 (QC预筛)
+
+在进行降采样、smbscw积分和结果输出之前, 对每个台站的记录做一次向量化的
+廉价检查, 不合格的台站直接跳过完整的处理流程:
+    pre_window:   记录未覆盖预事件窗口 (ipre之后没有数据或ipre过小)
+    dead:         某分量在整个记录中为常数
+    flatline:     某分量有过长的连续相同值段
+    clipped:      某分量在其最大幅值处有连续多个样点(限幅)
+    low_snr:      事件段峰值与预事件噪声均方根之比过低
+    short_record: 在预览序列上按smgetout的能量准则判断数据长度不足
+
+限幅和平直段在原始记录上检查(需要逐点的连续性), 信噪比和能量准则在
+按输出采样间隔gv.dt抽取的预览序列上计算. 结果以JSON Lines格式写入
+gv.outdir/qc.jsonl, 每行一个台站.
+"""
+
+import json
+import os
+from typing import Dict, List
+import numpy as np
+import numpy.typing as npt
+from smalloc import Constants, GlobalVars, AllocatableVars
+
+QC_SNRMIN = 3.0  # 最小信噪比
+QC_CLIPRUN = 5  # 限幅判定: 最大幅值处的最少连续样点数
+QC_FLATFRAC = 0.2  # 平直段判定: 连续相同值段占记录长度的最大比例
+
+
+def _maxrun(mask: npt.NDArray[np.bool_]) -> int:
+    """布尔序列中最长的连续True段长度"""
+    if not np.any(mask):
+        return 0
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.nonzero(edges == 1)[0]
+    ends = np.nonzero(edges == -1)[0]
+    return int(np.max(ends - starts))
+
+
+def smqcsta(
+    const: Constants,
+    gv: GlobalVars,
+    av: AllocatableVars,
+    ist: int,
+    dat: npt.NDArray[np.float64],
+) -> Dict:
+    """
+    对单个台站的原始记录进行快速质量检查
+
+    参数:
+        const: Constants实例，包含常量
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例，包含可分配变量 (不被修改)
+        ist: 台站索引
+        dat: (nwin x 3) 原始记录 (见smreaddat)
+
+    返回:
+        Dict: QC记录, 包括stcode, okay, reasons及各项指标
+    """
+    reasons: List[str] = []
+    qc = {"stcode": av.stcode[ist], "okay": False, "reasons": reasons}
+    sample = av.sample[ist]
+    start = av.start[ist]
+    nraw = len(dat)
+    ipre = 1 + int((av.ponset[ist] - start - const.DTP) / sample)
+    qc["nraw"] = nraw
+    qc["ipre"] = ipre
+
+    # 预事件窗口
+    if ipre < 2 or nraw <= ipre + 1:
+        reasons.append("pre_window")
+        return qc
+
+    # 常数分量和平直段 (原始记录)
+    flat = np.diff(dat, axis=0) == 0
+    runs = [_maxrun(flat[:, j]) + 1 for j in range(3)]
+    qc["maxflat"] = max(runs)
+    if np.any(np.all(flat, axis=0)):
+        reasons.append("dead")
+    elif max(runs) >= QC_FLATFRAC * nraw:
+        reasons.append("flatline")
+
+    # 限幅 (原始记录)
+    amax = np.max(np.abs(dat), axis=0)
+    clip = np.abs(dat) >= amax * (1.0 - 1.0e-6)
+    nclip = max(_maxrun(clip[:, j]) if amax[j] > 0 else 0 for j in range(3))
+    qc["maxclip"] = nclip
+    if nclip >= QC_CLIPRUN:
+        reasons.append("clipped")
+
+    # 预览序列: 按输出采样间隔抽取
+    step = max(1, round(gv.dt / sample)) if sample < gv.dt else 1
+    ipv = max(1, ipre // step)
+    preview = dat[::step]
+    pre = preview[:ipv]
+    post = preview[ipv:]
+
+    # 信噪比
+    mean = np.mean(pre, axis=0, dtype=np.float64)
+    noise = np.sqrt(np.mean((pre - mean) ** 2, axis=0, dtype=np.float64))
+    peak = np.max(np.abs(post - mean), axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        snr = float(np.max(np.where(noise > 0, peak / noise, np.inf)))
+    qc["snr"] = snr if np.isfinite(snr) else None
+    if snr < QC_SNRMIN:
+        reasons.append("low_snr")
+
+    # 能量准则 (与smgetout一致, 在预览序列上计算)
+    dtp = step * sample
+    accoff = np.mean(post - mean, axis=0, dtype=np.float64)
+    sigma = np.sqrt(np.sum((post - mean - accoff) ** 2, axis=1))
+    ene = np.cumsum(sigma)
+    ipga = int(np.argmax(sigma))
+    tpga = start + (ipv + ipga) * dtp
+    nend = min(len(ene), 20 * round((tpga - av.ponset[ist]) / dtp))
+    if nend <= 0:
+        reasons.append("short_record")
+    else:
+        isdw = np.searchsorted(ene[:nend], const.SDW * ene[nend - 1])
+        iddw = np.searchsorted(ene[:nend], const.DDW * ene[nend - 1])
+        tsdw = start + (ipv + isdw) * dtp
+        tddw = start + (ipv + iddw) * dtp
+        tpga = min(tpga, tsdw)
+        pstwin = min(tpga - start, const.PSTWIN)
+        length = min((nraw - 1) * sample, tddw - start + pstwin)
+        qc["tsdw"] = float(tsdw)
+        qc["tddw"] = float(tddw)
+        if tsdw > start + length - pstwin:
+            reasons.append("short_record")
+
+    qc["okay"] = not reasons
+    return qc
+
+
+def smqcwrite(gv: GlobalVars, report: List[Dict], outfile: str = "qc.jsonl"):
+    """
+    写出QC报告 (JSON Lines, 每行一个台站)
+
+    参数:
+        gv: GlobalVars实例，包含全局变量
+        report: smqcsta返回的QC记录列表
+        outfile: 输出文件名 (位于gv.outdir)
+    """
+    with open(os.path.join(gv.outdir, outfile), "w") as f:
+        for qc in report:
+            f.write(json.dumps(qc, ensure_ascii=False) + "\n")
@@ -0,0 +1,374 @@
+"""
+基于共享文件系统的多节点任务队列
+
+不需要消息服务器, 只依赖共享文件系统上rename的原子性:
+    init:  协调进程将smgetinp得到的台站划分为若干分片, 写入
+           gv.outdir/queue/todo/
+    work:  任意节点上的任意数量工作进程, 通过把分片文件从todo/改名到
+           claimed/来认领分片, 对其中的台站调用smgetsta进行基线校正,
+           结果写入results/后将分片移入done/
+    merge: 所有分片完成后汇总结果, 按震中距顺序写出coseis.dat
+
+工作进程在处理分片期间由后台线程定期更新认领文件的修改时间(心跳),
+单个台站处理时间很长时也不会中断; 超过timeout未更新的认领视为进程已
+失效, 分片会被放回todo/重新处理.
+
+用法:
+    python smqueue.py init  <输入文件> <分片数>
+    python smqueue.py work  <输入文件>
+    python smqueue.py merge <输入文件>
+    python smqueue.py local <输入文件> <进程数> [分片数]  # 本机多进程模拟多节点
+"""
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+import numpy as np
+from smalloc import Constants, GlobalVars, AllocatableVars
+from smcache import SmCache
+from smgetinp import smgetinp
+from smgetout import smgetsta, smstore, smwritecoseis
+from smkernel import setbackend
+from smlog import log, smloginit, smlogstop
+from smoutput import SMC_FILE, smcmerge
+from smqc import smqcwrite
+
+QUEUE_STAGES = ("todo", "claimed", "done", "results")
+
+
+def _qdir(gv: GlobalVars, stage: str = "") -> str:
+    """队列目录 gv.outdir/queue/<stage>"""
+    return os.path.join(gv.outdir, "queue", stage)
+
+
+def _writeatomic(path: str, write):
+    """先写临时文件再改名, 保证其他节点不会读到不完整的文件"""
+    tmp = f"{path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+@contextmanager
+def _heartbeat(path: str, interval: float):
+    """处理分片期间, 每interval秒更新一次认领文件的修改时间"""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(interval):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass  # 认领已因超时被放回
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def smqinit(gv: GlobalVars, av: AllocatableVars, nshard: int) -> int:
+    """
+    协调进程: 建立任务队列
+
+    台站按震中距顺序交错分配到各分片, 使各分片的近场台站数量相近.
+
+    参数:
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例，包含可分配变量
+        nshard: 分片数量
+
+    返回:
+        int: 实际的分片数量
+    """
+    nshard = max(1, min(nshard, gv.nst))
+    shutil.rmtree(_qdir(gv), ignore_errors=True)
+    for stage in QUEUE_STAGES:
+        os.makedirs(_qdir(gv, stage))
+
+    manifest = {"nshard": nshard, "nst": gv.nst, "stcode": list(av.stcode)}
+    _writeatomic(
+        os.path.join(_qdir(gv), "manifest.json"),
+        lambda f: f.write(json.dumps(manifest).encode("utf-8")),
+    )
+
+    for k in range(nshard):
+        shard = {"shard": k, "stations": list(range(k, gv.nst, nshard))}
+        _writeatomic(
+            os.path.join(_qdir(gv, "todo"), f"shard_{k:05d}.json"),
+            lambda f: f.write(json.dumps(shard).encode("utf-8")),
+        )
+
+    log.info(f" 任务队列: {gv.nst}个台站, {nshard}个分片")
+    return nshard
+
+
+def smqclaim(gv: GlobalVars, owner: str) -> Optional[str]:
+    """
+    认领一个分片
+
+    参数:
+        gv: GlobalVars实例，包含全局变量
+        owner: 认领者标识 (主机名.进程号)
+
+    返回:
+        Optional[str]: 认领文件路径, 没有待处理分片时为None
+    """
+    todo = _qdir(gv, "todo")
+    for name in sorted(os.listdir(todo)):
+        if not name.endswith(".json"):
+            continue
+        dst = os.path.join(_qdir(gv, "claimed"), f"{name}.{owner}")
+        try:
+            os.rename(os.path.join(todo, name), dst)
+        except FileNotFoundError:
+            continue  # 已被其他进程认领
+        return dst
+    return None
+
+
+def smqrequeue(gv: GlobalVars, timeout: float) -> int:
+    """
+    将超过timeout秒没有心跳的认领放回待处理队列
+
+    参数:
+        gv: GlobalVars实例，包含全局变量
+        timeout: 心跳超时(s)
+
+    返回:
+        int: 仍在处理中的分片数量 (含被放回的分片)
+    """
+    claimed = _qdir(gv, "claimed")
+    now = time.time()
+    pending = 0
+    for name in os.listdir(claimed):
+        path = os.path.join(claimed, name)
+        try:
+            stale = now - os.path.getmtime(path) > timeout
+            if stale:
+                shard = name[: name.index(".json") + len(".json")]
+                os.rename(path, os.path.join(_qdir(gv, "todo"), shard))
+                log.warning(f" 分片 {shard} 认领超时, 重新排队")
+        except (FileNotFoundError, ValueError):
+            continue
+        pending += 1
+    return pending
+
+
+def smqwork(
+    const: Constants,
+    gv: GlobalVars,
+    av: AllocatableVars,
+    timeout: float = 600.0,
+    poll: float = 5.0,
+) -> int:
+    """
+    工作进程: 循环认领并处理分片, 直到队列为空
+
+    参数:
+        const: Constants实例，包含常量
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例，包含可分配变量
+        timeout: 认领心跳超时(s)
+        poll: 其他进程仍在处理时的等待间隔(s)
+
+    返回:
+        int: 本进程处理的分片数量
+    """
+    owner = f"{socket.gethostname()}.{os.getpid()}"
+    setbackend(gv.backend)
+    cache = SmCache(gv.cachedir) if gv.cachedir else None
+
+    nproc = 0
+    while True:
+        path = smqclaim(gv, owner)
+        if path is None:
+            # 没有待处理分片: 回收失效的认领, 全部完成后退出
+            if smqrequeue(gv, timeout) == 0:
+                break
+            time.sleep(poll)
+            continue
+
+        with open(path, "r") as f:
+            shard = json.load(f)
+        stations = shard["stations"]
+        name = f"shard_{shard['shard']:05d}"
+
+        report = []
+        store = smstore(gv, os.path.join(_qdir(gv, "results"), f"{name}.smc"))
+        with _heartbeat(path, timeout / 10.0):
+            try:
+                for ist in stations:
+                    try:
+                        smgetsta(const, gv, av, ist, cache, report, store)
+                    except Exception as e:
+                        log.warning(
+                            f"{av.stcode[ist]}   ... 处理出错: {str(e)}",
+                            extra={
+                                "station": av.stcode[ist],
+                                "okay": False,
+                                "reason": "error",
+                            },
+                        )
+                        av.okay[ist] = False
+
+                # 写出分片结果
+                if store is not None:
+                    store.close()
+            except BaseException:
+                # 中断时不留下不完整的分片结果, 认领失效后由其他进程重做
+                if store is not None:
+                    store.abort()
+                raise
+        if gv.qc:
+            smqcwrite(gv, report, os.path.join("queue", "results", f"{name}.qc.jsonl"))
+        ist = np.array(stations, dtype=np.int64)
+        _writeatomic(
+            os.path.join(_qdir(gv, "results"), f"{name}.npz"),
+            lambda f: np.savez(
+                f,
+                ist=ist,
+                okay=av.okay[ist],
+                offset=av.offset[:, ist],
+                rbserr=av.rbserr[:, ist],
+                tpga=av.tpga[ist],
+                tsdw=av.tsdw[ist],
+                tddw=av.tddw[ist],
+            ),
+        )
+        try:
+            os.replace(path, os.path.join(_qdir(gv, "done"), f"{name}.json"))
+        except FileNotFoundError:
+            pass  # 认领已因超时被放回, 结果相同, 可安全重复处理
+        nproc += 1
+
+    return nproc
+
+
+def smqmerge(const: Constants, gv: GlobalVars, av: AllocatableVars) -> bool:
+    """
+    汇总所有分片的结果并写出coseis.dat
+
+    参数:
+        const: Constants实例，包含常量
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例，包含可分配变量
+
+    返回:
+        bool: 是否成功
+    """
+    try:
+        with open(os.path.join(_qdir(gv), "manifest.json"), "r") as f:
+            manifest = json.load(f)
+        if manifest["stcode"] != list(av.stcode):
+            raise ValueError("任务队列与当前输入文件的台站列表不一致")
+
+        av.okay[:] = False
+        for k in range(manifest["nshard"]):
+            path = os.path.join(_qdir(gv, "results"), f"shard_{k:05d}.npz")
+            if not os.path.exists(path):
+                raise ValueError(f"分片 {k} 尚未完成")
+            with np.load(path) as res:
+                ist = res["ist"]
+                av.okay[ist] = res["okay"]
+                av.offset[:, ist] = res["offset"]
+                av.rbserr[:, ist] = res["rbserr"]
+                av.tpga[ist] = res["tpga"]
+                av.tsdw[ist] = res["tsdw"]
+                av.tddw[ist] = res["tddw"]
+
+        # 按台站顺序汇总各分片的QC报告
+        if gv.qc:
+            order = {code: i for i, code in enumerate(av.stcode)}
+            report = []
+            for k in range(manifest["nshard"]):
+                path = os.path.join(_qdir(gv, "results"), f"shard_{k:05d}.qc.jsonl")
+                if os.path.exists(path):
+                    with open(path, "r") as f:
+                        report.extend(json.loads(line) for line in f if line.strip())
+            report.sort(key=lambda qc: order[qc["stcode"]])
+            smqcwrite(gv, report)
+
+        # 合并各分片的container输出, 台站按震中距顺序排列
+        if gv.outfmt in ("container", "memmap"):
+            smcmerge(
+                [
+                    os.path.join(_qdir(gv, "results"), f"shard_{k:05d}.smc")
+                    for k in range(manifest["nshard"])
+                ],
+                os.path.join(gv.outdir, SMC_FILE),
+                av.stcode,
+            )
+
+        gv.nst = smwritecoseis(const, gv, av)
+        log.info(f" ====== {gv.nst}个台站的基线校正完成 =======")
+        return True
+
+    except Exception as e:
+        log.error(f" smqmerge出错: {str(e)}")
+        return False
+
+
+def main():
+    """
+    分布式处理入口
+    """
+    try:
+        if len(sys.argv) < 3 or sys.argv[1] not in ("init", "work", "merge", "local"):
+            raise ValueError(
+                "usage: smqueue.py init|work|merge|local <input file> [n] [nshard]"
+            )
+        mode, input_file = sys.argv[1], sys.argv[2]
+
+        smloginit()
+        const, gv, av, success = smgetinp(input_file)
+        if not success:
+            raise ValueError("Failed to read input file")
+
+        # 每个进程写自己的JSON Lines日志, 避免多个节点同时写一个文件
+        smloginit(
+            os.path.join(gv.outdir, f"smblc.{socket.gethostname()}.{os.getpid()}.jsonl")
+        )
+
+        if mode == "init":
+            nshard = int(sys.argv[3]) if len(sys.argv) > 3 else gv.nst
+            smqinit(gv, av, nshard)
+        elif mode == "work":
+            nproc = smqwork(const, gv, av)
+            log.info(f" 工作进程 {os.getpid()} 处理了 {nproc} 个分片")
+        elif mode == "merge":
+            if not smqmerge(const, gv, av):
+                return 1
+        else:
+            # 本机多进程模拟多个节点
+            nworker = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+            nshard = int(sys.argv[4]) if len(sys.argv) > 4 else 4 * nworker
+            smqinit(gv, av, nshard)
+            cmd = [sys.executable, os.path.abspath(__file__), "work", input_file]
+            workers = [subprocess.Popen(cmd) for _ in range(nworker)]
+            if any([p.wait() != 0 for p in workers]):
+                raise ValueError("工作进程异常退出")
+            if not smqmerge(const, gv, av):
+                return 1
+        return 0
+
+    except Exception as e:
+        log.error(f"Error: {str(e)}")
+        return 1
+
+    finally:
+        smlogstop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,408 @@
+"""
+基线校正结果的回归检查 (黄金输出 + 性能预算)
+
+对确定性生成的合成地震事件执行与smmain相同的处理流程(smgetinp + smgetout),
+将coseis.dat和各台站的_blc.dat逐列与保存的黄金输出比较, 同时检查各阶段的
+耗时和内存峰值是否超出预算. 数值漂移或性能退化都会使检查失败(返回码1).
+
+黄金输出与原Fortran smblc2023的输出格式相同, 保存在regress/<事件>/golden/
+中, 由移植后未做任何优化的初始版本(与Fortran的处理流程逐行对应)处理
+"synth"生成的输入文件得到; 合成数据本身不保存, check时重新生成. 也可以用
+Fortran程序处理同样的输入文件得到黄金输出, 或用"update"由当前代码生成
+(仅在确认结果正确后使用). 预算由"update"按实测值加余量写入budget.json,
+可手工调整.
+
+用法:
+    python smregress.py synth  [目录]  # 只生成合成事件的输入文件和数据
+    python smregress.py update [目录]  # 运行并保存黄金输出和预算
+    python smregress.py check  [目录]  # 运行并与黄金输出比较 (默认)
+
+目录默认为本文件所在目录下的regress/.
+"""
+
+import glob
+import json
+import os
+import shutil
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+import numpy as np
+import smgetout as smgetout_module
+from smgetinp import smgetinp
+from smgetout import smgetout
+
+# 合成事件: 台站震中距(km), 采样间隔(s), 记录长度(s), 同震位移(m), 随机种子
+REGRESS_EVENTS: Dict[str, Dict] = {
+    "nearfield": {
+        "hypo": (38.0, 37.2, 10.0),
+        "epidis": [4.0, 9.0, 15.0, 24.0],
+        "sample": [0.005, 0.005, 0.01, 0.01],
+        "length": 90.0,
+        "offset": 2.0,
+        "seed": 20230206,
+    },
+    "network": {
+        "hypo": (38.0, 37.2, 15.0),
+        "epidis": [12.0, 20.0, 33.0, 47.0, 61.0, 80.0, 105.0, 140.0, 190.0, 260.0],
+        "sample": [0.01, 0.01, 0.01, 0.02, 0.01, 0.02, 0.01, 0.02, 0.01, 0.01],
+        "length": 150.0,
+        "offset": 0.8,
+        "seed": 7,
+    },
+}
+
+REGRESS_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "regress")
+
+# 逐列比较的容差: |a-b| <= atol + rtol*max|黄金列|
+# coseis.dat按输出格式的末位(8.3f/8.4f)给出绝对容差
+REGRESS_COSEIS_ATOL: Dict[str, float] = {
+    "Lat[deg]": 1.0e-4,
+    "Lon[deg]": 1.0e-4,
+    "Epdis[km]": 1.0e-3,
+    "East[m]": 2.0e-3,
+    "North[m]": 2.0e-3,
+    "Up[m]": 2.0e-3,
+    "RbserrE": 2.0e-4,
+    "RbserrN": 2.0e-4,
+    "RbserrU": 2.0e-4,
+}
+REGRESS_BLC_RTOL = 1.0e-4  # _blc.dat相对于各列峰值的容差
+REGRESS_BLC_TIME_ATOL = 1.0e-3  # _blc.dat时间列的绝对容差(s)
+
+# update时预算 = 实测值 * 倍数 + 余量
+REGRESS_TIME_FACTOR = 3.0
+REGRESS_TIME_MARGIN = 1.0  # s
+REGRESS_MEM_FACTOR = 1.5
+REGRESS_MEM_MARGIN = 16 * 1024 * 1024  # bytes
+
+
+def smsynth(root: str, name: str) -> str:
+    """
+    生成一个合成地震事件的输入文件、SMDataInfo.dat和台站记录
+
+    每个台站的加速度由三部分组成: 预事件白噪声, S波到达后的衰减振荡,
+    以及使位移产生永久偏移的平滑斜坡(升余弦)的二阶导数; 水平分量在强震后
+    叠加一个小的基线阶跃, 模拟需要校正的基线漂移.
+
+    参数:
+        root: 回归检查根目录
+        name: REGRESS_EVENTS中的事件名
+
+    返回:
+        str: 输入文件路径
+    """
+    ev = REGRESS_EVENTS[name]
+    rng = np.random.default_rng(ev["seed"])
+    evdir = os.path.join(root, name)
+    datadir = os.path.join(evdir, "data")
+    os.makedirs(datadir, exist_ok=True)
+    shutil.rmtree(os.path.join(evdir, "out"), ignore_errors=True)
+
+    lat0, lon0, depth = ev["hypo"]
+    accunit = 0.01  # 记录单位cm/s^2
+    stations = []
+    for k, (dis, sample) in enumerate(zip(ev["epidis"], ev["sample"])):
+        azi = 2.0 * np.pi * k / len(ev["epidis"]) + 0.3
+        lat = lat0 + dis * np.cos(azi) / 111.19
+        lon = lon0 + dis * np.sin(azi) / (111.19 * np.cos(np.radians(lat0)))
+        hyp = np.hypot(dis, depth)
+        tp = round(hyp / 6.0, 2)
+        ts = hyp / 3.5
+        start = round(tp - 20.0, 2)
+        nsam = int(ev["length"] / sample) + 1
+        t = start + sample * np.arange(nsam)
+
+        # 同震位移随距离衰减, 各分量方向不同
+        amp = ev["offset"] / (1.0 + (dis / 20.0) ** 2)
+        dirs = np.array([np.sin(azi), np.cos(azi), -0.5])
+        rise = 2.0 + dis / 40.0
+        phase = np.clip((t - ts) / rise, 0.0, 1.0)
+        inside = (t > ts) & (t < ts + rise)
+        ramp = np.where(inside, 0.5 * (np.pi / rise) ** 2 * np.cos(np.pi * phase), 0.0)
+
+        acc = np.empty((nsam, 3))
+        shake = 3.0 / (1.0 + dis / 10.0)
+        env = np.where(t > tp, np.exp(-np.maximum(t - ts, 0.0) / 8.0), 0.0)
+        env *= np.clip((t - tp) / max(ts - tp, sample), 0.0, 1.0)
+        for j in range(3):
+            freq = 1.0 + 0.7 * j + 0.1 * k
+            acc[:, j] = (
+                amp * dirs[j] * ramp
+                + shake * env * np.sin(2.0 * np.pi * freq * t + rng.uniform(0, np.pi))
+                + 1.0e-4 * rng.standard_normal(nsam)
+            )
+        # 水平分量的基线阶跃
+        acc[t > ts + rise, :2] += 2.0e-3 * rng.uniform(-1.0, 1.0, 2)
+
+        code = f"S{k:03d}"
+        np.savetxt(os.path.join(datadir, f"{code}.dat"), acc / accunit, fmt="%14.6E")
+        stations.append((code, lat, lon, start, tp, ev["length"], sample))
+
+    with open(os.path.join(datadir, "SMDataInfo.dat"), "w") as f:
+        f.write(f"# synthetic event '{name}' for smregress\n")
+        f.write("2023 02 06 10 24 59\n")
+        f.write(f"{lat0} {lon0} {depth}\n")
+        f.write(f"{len(stations)} {accunit}\n")
+        f.write("1 2 3\n")
+        for code, lat, lon, start, tp, length, sample in stations:
+            f.write(
+                f"{code:10} {lat:10.5f} {lon:10.5f} {start:10.3f}"
+                f" {tp:10.3f} {length:10.3f} {sample:8.4f}\n"
+            )
+
+    input_file = os.path.join(evdir, f"{name}.inp")
+    with open(input_file, "w") as f:
+        f.write(f"# smregress synthetic event '{name}'\n")
+        f.write("2023 02 06 10 24 59\n")
+        f.write(f"{lat0} {lon0} {depth}\n")
+        f.write(f"   '{datadir}/'\n")
+        f.write("  0.0  1000.0\n")
+        f.write(f"   '{os.path.join(evdir, 'out')}'\n")
+        f.write("   'coseis.dat'\n")
+        f.write("   0.1\n")
+    return input_file
+
+
+@contextmanager
+def _stagetimer(stats: Dict[str, Dict[str, float]], name: str):
+    """记录一个阶段的耗时和内存峰值 (tracemalloc)"""
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats[name] = {
+            "time": time.perf_counter() - t0,
+            "peak": float(tracemalloc.get_traced_memory()[1] - base),
+        }
+
+
+def _wrapstage(stats: Dict[str, Dict[str, float]], name: str):
+    """替换smgetout模块中的函数, 累计其耗时 (返回还原函数)"""
+    func = getattr(smgetout_module, name)
+    stats[name] = {"time": 0.0}
+
+    def timed(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats[name]["time"] += time.perf_counter() - t0
+
+    setattr(smgetout_module, name, timed)
+    return lambda: setattr(smgetout_module, name, func)
+
+
+def smregrun(input_file: str) -> Tuple[str, Dict[str, Dict[str, float]]]:
+    """
+    按smmain的流程处理一个事件并记录各阶段的耗时和内存峰值
+
+    阶段smgetinp和smgetout记录耗时和内存峰值, smgetout内部的smpick和
+    smbscw记录累计耗时. 内存峰值由tracemalloc统计(numpy数组的分配也被计入).
+
+    参数:
+        input_file: 输入文件路径
+
+    返回:
+        Tuple[str, Dict]: (输出目录, 阶段 -> {"time": s, "peak": bytes})
+    """
+    stats: Dict[str, Dict[str, float]] = {}
+    restore = [_wrapstage(stats, name) for name in ("smpick", "smbscw")]
+    tracemalloc.start()
+    try:
+        with _stagetimer(stats, "smgetinp"):
+            const, gv, av, success = smgetinp(input_file)
+        if not success:
+            raise ValueError(f"smgetinp failed ({input_file})")
+        with _stagetimer(stats, "smgetout"):
+            success = smgetout(const, gv, av)
+        if not success:
+            raise ValueError(f"smgetout failed ({input_file})")
+    finally:
+        tracemalloc.stop()
+        for undo in restore:
+            undo()
+    return gv.outdir, stats
+
+
+def _readtable(path: str) -> Tuple[List[str], List[str], np.ndarray]:
+    """
+    读取coseis.dat或_blc.dat
+
+    返回:
+        (列名, 台站代码, 数值): coseis.dat的第一列为台站代码, _blc.dat没有
+    """
+    with open(path, "r") as f:
+        header = f.readline().split()
+        rows = [line.split() for line in f if line.strip()]
+    codes = []
+    if header and header[0] == "Station":
+        header = header[1:]
+        codes = [row[0] for row in rows]
+        rows = [row[1:] for row in rows]
+    values = np.array(rows, dtype=np.float64).reshape(-1, len(header))
+    return header, codes, values
+
+
+def _compare(path: str, gold: str) -> List[str]:
+    """逐列比较一个输出文件和黄金输出, 返回不一致的描述"""
+    if not os.path.exists(path):
+        return [f"{os.path.basename(gold)}: 未生成输出"]
+    name = os.path.basename(gold)
+    cols, codes, new = _readtable(path)
+    gcols, gcodes, ref = _readtable(gold)
+    if cols != gcols:
+        return [f"{name}: 列名不一致 {cols} != {gcols}"]
+    if codes != gcodes:
+        missing = sorted(set(gcodes) - set(codes))
+        extra = sorted(set(codes) - set(gcodes))
+        return [f"{name}: 台站不一致 (缺少 {missing}, 多出 {extra})"]
+    if new.shape != ref.shape:
+        return [f"{name}: 行数不一致 {len(new)} != {len(ref)}"]
+
+    errors = []
+    for k, col in enumerate(cols):
+        if codes:
+            tol = REGRESS_COSEIS_ATOL.get(col, 0.0)
+        elif col == "Time":
+            tol = REGRESS_BLC_TIME_ATOL
+        else:
+            tol = REGRESS_BLC_RTOL * max(np.max(np.abs(ref[:, k])), 1.0e-12)
+        diff = np.abs(new[:, k] - ref[:, k])
+        if len(diff) > 0 and np.max(diff) > tol:
+            i = int(np.argmax(diff))
+            where = codes[i] if codes else f"第{i + 2}行"
+            errors.append(
+                f"{name}: 列 {col} 超出容差 {tol:.3e}:"
+                f" {where} {new[i, k]:.7e} != {ref[i, k]:.7e}"
+            )
+    return errors
+
+
+def _golden(root: str, name: str) -> str:
+    return os.path.join(root, name, "golden")
+
+
+def smregupdate(root: str, name: str) -> Dict[str, Dict[str, float]]:
+    """
+    运行一个事件并保存黄金输出和性能预算
+
+    参数:
+        root: 回归检查根目录
+        name: 事件名
+
+    返回:
+        Dict: 写入budget.json的预算
+    """
+    outdir, stats = smregrun(smsynth(root, name))
+    gold = _golden(root, name)
+    shutil.rmtree(gold, ignore_errors=True)
+    os.makedirs(gold)
+    for path in [os.path.join(outdir, "coseis.dat")] + sorted(
+        glob.glob(os.path.join(outdir, "*_blc.dat"))
+    ):
+        shutil.copy2(path, gold)
+
+    budget = {}
+    for stage, stat in stats.items():
+        budget[stage] = {
+            "time": REGRESS_TIME_FACTOR * stat["time"] + REGRESS_TIME_MARGIN
+        }
+        if "peak" in stat:
+            budget[stage]["peak"] = (
+                REGRESS_MEM_FACTOR * stat["peak"] + REGRESS_MEM_MARGIN
+            )
+    with open(os.path.join(gold, "budget.json"), "w") as f:
+        json.dump(budget, f, indent=2)
+    print(f" {name}: 黄金输出已更新 ({gold})")
+    return budget
+
+
+def smregcheck(root: str, name: str) -> List[str]:
+    """
+    运行一个事件并与黄金输出和性能预算比较
+
+    参数:
+        root: 回归检查根目录
+        name: 事件名
+
+    返回:
+        List[str]: 失败项的描述, 为空表示通过
+    """
+    gold = _golden(root, name)
+    if not os.path.exists(os.path.join(gold, "coseis.dat")):
+        return [f"{name}: 没有黄金输出, 请先运行update"]
+
+    outdir, stats = smregrun(smsynth(root, name))
+    errors = []
+    for path in [os.path.join(gold, "coseis.dat")] + sorted(
+        glob.glob(os.path.join(gold, "*_blc.dat"))
+    ):
+        errors += _compare(os.path.join(outdir, os.path.basename(path)), path)
+    extra = {os.path.basename(p) for p in glob.glob(os.path.join(outdir, "*_blc.dat"))}
+    extra -= {os.path.basename(p) for p in glob.glob(os.path.join(gold, "*_blc.dat"))}
+    errors += [f"{p}: 黄金输出中没有此台站" for p in sorted(extra)]
+
+    budget_file = os.path.join(gold, "budget.json")
+    budget = {}
+    if os.path.exists(budget_file):
+        with open(budget_file, "r") as f:
+            budget = json.load(f)
+    for stage, stat in stats.items():
+        limit = budget.get(stage, {})
+        line = f" {name:10} {stage:9} {stat['time']:8.3f} s"
+        if "peak" in stat:
+            line += f" {stat['peak'] / 2**20:9.1f} MB"
+        print(line)
+        if "time" in limit and stat["time"] > limit["time"]:
+            errors.append(
+                f"{name}: {stage} 耗时 {stat['time']:.3f} s"
+                f" 超出预算 {limit['time']:.3f} s"
+            )
+        if "peak" in limit and stat.get("peak", 0.0) > limit["peak"]:
+            errors.append(
+                f"{name}: {stage} 内存峰值 {stat['peak'] / 2**20:.1f} MB"
+                f" 超出预算 {limit['peak'] / 2**20:.1f} MB"
+            )
+    return errors
+
+
+def main():
+    """
+    回归检查入口
+    """
+    try:
+        mode = sys.argv[1] if len(sys.argv) > 1 else "check"
+        root = sys.argv[2] if len(sys.argv) > 2 else REGRESS_ROOT
+        if mode not in ("synth", "update", "check"):
+            raise ValueError("usage: smregress.py synth|update|check [directory]")
+
+        errors = []
+        for name in REGRESS_EVENTS:
+            if mode == "synth":
+                print(f" {name}: {smsynth(root, name)}")
+            elif mode == "update":
+                smregupdate(root, name)
+            else:
+                errors += smregcheck(root, name)
+
+        if errors:
+            print(" ====== 回归检查失败 ======")
+            for error in errors:
+                print(f" {error}")
+            return 1
+        if mode == "check":
+            print(" ====== 回归检查通过 ======")
+        return 0
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""
+按记录长度负载均衡的本机多进程调度
+
+各台站在smgetout中的处理时间与原始样点数(读入和能量曲线)及降采样后的
+样点数(降采样、smbscw和文本输出)成正比, 可相差几个数量级. 按震中距顺序
+处理时, 近场的长记录往往最后才开始, 成为拖尾. 本模块:
+    1. 由台站信息估计每个台站的代价 (smcost)
+    2. 代价小的台站合并为一个任务, 减少进程间通信次数 (smchunks)
+    3. 任务按代价从大到小分配给各工作进程 (最长优先, smassign)
+    4. 工作进程完成自己的任务后, 从剩余代价最大的进程的队尾窃取任务
+coseis.dat、QC报告、container输出及逐台站的日志记录仍按震中距顺序给出.
+其余日志通过smlog的队列汇总到调度进程.
+
+用法:
+    python smsched.py <输入文件> [进程数]
+"""
+
+import multiprocessing as mp
+import os
+import sys
+from collections import deque
+from multiprocessing.connection import wait
+from typing import Deque, Dict, List
+import numpy as np
+import numpy.typing as npt
+from smalloc import Constants, GlobalVars, AllocatableVars
+from smcache import SmCache
+from smgetinp import smgetinp
+from smgetout import smgetsta, smstore, smwritecoseis
+from smkernel import setbackend
+from smlog import (
+    log,
+    smloginit,
+    smlogattach,
+    smlogcapture,
+    smlogqueue,
+    smlogstop,
+    smprogress,
+    smprogressend,
+)
+from smoutput import SMC_FILE, smcmerge
+from smqc import smqcwrite
+
+SCHED_CRAW = 1.0  # 每个原始样点的相对代价 (文本读入和能量曲线)
+SCHED_CDEC = 12.0  # 每个降采样样点的相对代价 (降采样、积分和文本输出)
+SCHED_CHUNKS = 8  # 每个工作进程平均分到的任务数 (决定小台站合并的粒度)
+
+
+def smcost(
+    const: Constants, gv: GlobalVars, av: AllocatableVars
+) -> npt.NDArray[np.float64]:
+    """
+    由台站信息估计每个台站的相对处理代价
+
+    参数:
+        const: Constants实例，包含常量
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例，包含可分配变量
+
+    返回:
+        np.ndarray: (nst,) 相对代价
+    """
+    nraw = av.length[: gv.nst] / av.sample[: gv.nst]
+    ndec = av.length[: gv.nst] / np.maximum(av.sample[: gv.nst], gv.dt)
+    return SCHED_CRAW * nraw + SCHED_CDEC * ndec
+
+
+def smchunks(
+    cost: npt.NDArray[np.float64], nworker: int, nchunk: int = SCHED_CHUNKS
+) -> List[List[int]]:
+    """
+    将台站分组为任务: 代价大的台站单独成为一个任务, 小台站合并
+
+    参数:
+        cost: (nst,) 每个台站的代价
+        nworker: 工作进程数
+        nchunk: 每个工作进程平均分到的任务数
+
+    返回:
+        List[List[int]]: 任务(台站索引列表), 按代价从大到小排列
+    """
+    target = float(np.sum(cost)) / max(1, nworker * nchunk)
+    tasks: List[List[int]] = []
+    group: List[int] = []
+    gcost = 0.0
+    for ist in np.argsort(-cost, kind="stable"):
+        group.append(int(ist))
+        gcost += cost[ist]
+        if gcost >= target:
+            tasks.append(group)
+            group, gcost = [], 0.0
+    if group:
+        tasks.append(group)
+    return tasks
+
+
+def smassign(
+    tasks: List[List[int]], cost: npt.NDArray[np.float64], nworker: int
+) -> List[Deque[List[int]]]:
+    """
+    最长优先分配: 依次将任务分给当前负载最小的工作进程
+
+    参数:
+        tasks: smchunks给出的任务 (代价从大到小)
+        cost: (nst,) 每个台站的代价
+        nworker: 工作进程数
+
+    返回:
+        List[deque]: 每个工作进程的任务队列 (队首代价最大)
+    """
+    queues: List[Deque[List[int]]] = [deque() for _ in range(nworker)]
+    load = np.zeros(nworker)
+    for task in tasks:
+        w = int(np.argmin(load))
+        queues[w].append(task)
+        load[w] += float(np.sum(cost[task]))
+    return queues
+
+
+def _worker(
+    conn,
+    const: Constants,
+    gv: GlobalVars,
+    av: AllocatableVars,
+    part: str,
+    logqueue,
+):
+    """
+    工作进程: 向调度进程请求任务, 处理后返回各台站的结果
+    """
+    smlogattach(logqueue)
+    setbackend(gv.backend)
+    cache = SmCache(gv.cachedir) if gv.cachedir else None
+    store = smstore(gv, part)
+    results: List = []
+    try:
+        while True:
+            conn.send(results)
+            task = conn.recv()
+            if task is None:
+                break
+            results = []
+            for ist in task:
+                report: List[Dict] = []
+                # 台站的日志记录随结果返回, 由调度进程按震中距顺序输出
+                with smlogcapture() as records:
+                    try:
+                        smgetsta(const, gv, av, ist, cache, report, store)
+                    except Exception as e:
+                        log.warning(
+                            f"{av.stcode[ist]}   ... 处理出错: {str(e)}",
+                            extra={
+                                "station": av.stcode[ist],
+                                "okay": False,
+                                "reason": "error",
+                            },
+                        )
+                        av.okay[ist] = False
+                results.append(
+                    (
+                        ist,
+                        bool(av.okay[ist]),
+                        av.offset[:, ist].copy(),
+                        av.rbserr[:, ist].copy(),
+                        av.tpga[ist],
+                        av.tsdw[ist],
+                        av.tddw[ist],
+                        report,
+                        records,
+                    )
+                )
+        if store is not None:
+            store.close()
+    except BaseException:
+        if store is not None:
+            store.abort()
+        raise
+    finally:
+        conn.close()
+
+
+def smsched(
+    const: Constants, gv: GlobalVars, av: AllocatableVars, nworker: int = 0
+) -> bool:
+    """
+    多进程负载均衡地完成所有台站的基线校正 (与smgetout的输出相同)
+
+    参数:
+        const: Constants实例，包含常量
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例，包含可分配变量
+        nworker: 工作进程数, 0表示CPU核数
+
+    返回:
+        bool: 是否成功
+    """
+    log.info(" 读取强震动数据...")
+    log.info(" 进行基线校正...")
+
+    log.debug(
+        "   Station  Lat[deg]  Lon[deg] Epdis[km]   East[m]  North[m]     Up[m]"
+        "   RbserrE   RbserrN   RbserrU"
+    )
+
+    # 工作进程的日志需要经由队列汇总
+    ownlog = smlogqueue() is None
+    if ownlog:
+        smloginit()
+
+    try:
+        nworker = max(1, min(nworker or os.cpu_count() or 1, gv.nst))
+        cost = smcost(const, gv, av)
+        tasks = smchunks(cost, nworker)
+        queues = smassign(tasks, cost, nworker)
+        remain = [sum(float(np.sum(cost[t])) for t in q) for q in queues]
+
+        parts = [os.path.join(gv.outdir, f"{SMC_FILE}.part{w}") for w in range(nworker)]
+        conns = []
+        procs = []
+        for w in range(nworker):
+            parent, child = mp.Pipe()
+            proc = mp.Process(
+                target=_worker,
+                args=(child, const, gv, av, parts[w], smlogqueue()),
+                daemon=True,
+            )
+            proc.start()
+            child.close()
+            conns.append(parent)
+            procs.append(proc)
+
+        # 结果按震中距顺序汇总
+        smprogress(gv.nst)
+        pending: Dict[int, tuple] = {}
+        report: List[Dict] = []
+        nextist = 0
+        active = {conn: w for w, conn in enumerate(conns)}
+        while active:
+            for conn in wait(list(active)):
+                w = active[conn]
+                try:
+                    results = conn.recv()
+                except EOFError:
+                    raise ValueError(f"工作进程 {w} 异常退出")
+                for res in results:
+                    pending[res[0]] = res
+
+                # 分配下一个任务: 先取自己的队首, 否则从剩余最多的进程队尾窃取
+                if not queues[w]:
+                    victim = int(np.argmax(remain))
+                    if queues[victim]:
+                        task = queues[victim].pop()
+                        remain[victim] -= float(np.sum(cost[task]))
+                        remain[w] += float(np.sum(cost[task]))
+                        queues[w].append(task)
+                if queues[w]:
+                    task = queues[w].popleft()
+                    remain[w] -= float(np.sum(cost[task]))
+                    conn.send(task)
+                else:
+                    conn.send(None)
+                    del active[conn]
+
+            while nextist in pending:
+                res = pending.pop(nextist)
+                av.okay[nextist] = res[1]
+                av.offset[:, nextist] = res[2]
+                av.rbserr[:, nextist] = res[3]
+                av.tpga[nextist], av.tsdw[nextist], av.tddw[nextist] = res[4:7]
+                report.extend(res[7])
+                for record in res[8]:
+                    log.handle(record)
+                nextist += 1
+
+        for proc in procs:
+            proc.join()
+        smprogressend()
+
+        if gv.qc:
+            smqcwrite(gv, report)
+        if gv.outfmt in ("container", "memmap"):
+            smcmerge(parts, os.path.join(gv.outdir, SMC_FILE), av.stcode)
+            for part in parts:
+                os.remove(part)
+
+        # 保存同震位移结果
+        gv.nst = smwritecoseis(const, gv, av)
+        log.info(f" ====== {gv.nst}个台站的基线校正完成 =======")
+        return True
+
+    except Exception as e:
+        log.error(f" smsched出错: {str(e)}")
+        return False
+
+    finally:
+        if ownlog:
+            smlogstop()
+
+
+def main():
+    """
+    多进程处理入口
+    """
+    try:
+        input_file = "smblc20230206_turkey_M77.inp"
+        if len(sys.argv) > 1:
+            input_file = sys.argv[1]
+        nworker = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+        smloginit()
+        log.info("Reading data...")
+        const, gv, av, success = smgetinp(input_file)
+        if not success:
+            raise ValueError("Failed to read input file")
+
+        smloginit(os.path.join(gv.outdir, "smblc.jsonl"))
+        log.info("Performing baseline correction...")
+        if not smsched(const, gv, av, nworker):
+            return 1
+
+        log.info("Processing completed successfully")
+        return 0
+
+    except Exception as e:
+        log.error(f"Error: {str(e)}")
+        return 1
+
+    finally:
+        smlogstop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
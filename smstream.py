@@ -0,0 +1,341 @@
+"""
+流式基线校正模块 (smbscw的在线版本)
+
+按数据包逐段输入已降采样(采样间隔gv.dt)并乘以accunit的加速度记录,
+增量维护速度积分、预事件线性拟合累加和以及累积能量曲线,
+在线判定SDW/DDW阈值, 一旦条件满足立即调用bscmono给出同震偏移.
+
+内存: SDW/DDW阈值是能量窗口内总能量的比例, 窗口关闭之前无法确定isdw,
+因此能量曲线以及加速度、速度仍需保存到窗口关闭为止, 不是严格的常数内存.
+缓冲区按需倍增, 大小与能量窗口(预事件段最多6*PREWIN, 加上
+ipre + 20*(ipga-ipre)及PSTWIN)成正比, 与记录总长度和gv.nwinmax无关;
+窗口关闭后的样点只计数不保存(bscmono只用到isdw为止的速度).
+
+与批处理(smgetout + smbscw)的差异:
+- PGA在已到达的数据中实时搜索. 能量窗口在到达 ipre + 20*(ipga-ipre)
+  且PGA已有PSTWIN没有被超过(或记录结束)时关闭, 之后才出现的更大峰值
+  不再延长窗口;
+- 能量在降采样后的序列上累积, 且不扣除事件后的平均加速度accoff
+  (该量需要完整记录才能得到).
+在smregress的两个合成事件上, 同震偏移与批处理之差: nearfield不超过
+0.4 mm (台站峰值偏移的0.8%), network不超过1.3 mm, 但远场小偏移台站
+可达其峰值偏移的19%; 远场台站的tddw可晚约10 s (记录尾部的accoff计入
+能量). 各事件的容差见test_smstream.py.
+"""
+
+import numpy as np
+import numpy.typing as npt
+from linefit import linefitsum
+from bscmono import bscmono
+from smgetout import smreaddat
+from smalloc import (
+    GlobalVars,
+    AllocatableVars,
+    Constants,
+)
+
+
+class SmStream:
+    """单个台站的流式基线校正器"""
+
+    def __init__(
+        self, ist: int, gv: GlobalVars, av: AllocatableVars, const: Constants
+    ):
+        """
+        参数说明:
+        ist: int, 台站索引
+        gv: GlobalVars, 全局变量
+        av: AllocatableVars, 可分配变量 (结果写回av.offset/av.rbserr等)
+        const: Constants, 常量
+        """
+        self.ist = ist
+        self.gv = gv
+        self.av = av
+        self.const = const
+        self.dt = gv.dt
+
+        # 选择预事件时间窗口 (与smbscw一致, 过长的预事件段在输入时直接跳过)
+        ipre = 1 + int((av.ponset[ist] - av.start[ist] - const.DTP) / gv.dt)
+        k = ipre - 1 - int(6.0 * const.PREWIN / gv.dt)
+        self.nskip = 0
+        if k > 0:
+            ipre -= k
+            self.nskip = k
+            av.start[ist] += float(k) * gv.dt
+            av.length[ist] -= float(k) * gv.dt
+        if ipre < 2:
+            raise ValueError(f"台站 {av.stcode[ist]} 预事件窗口过短")
+        self.ipre = ipre
+
+        # 按需增长的缓冲区 (最多gv.nwinmax个样点)
+        self.nmax = gv.nwinmax
+        size = min(self.nmax, 2 * ipre)
+        self.acc = np.zeros((size, 3), dtype=np.float64)
+        self.vel = np.zeros((size, 3), dtype=np.float64)
+        self.ene = np.zeros(size, dtype=np.float64)
+
+        # 增量状态
+        self.n = 0  # 已接收(跳过nskip之后)的样点数
+        self.accsum = np.zeros(3)  # 预事件加速度之和
+        self.sumy = np.zeros(3)  # 预事件速度之和
+        self.sumxy = np.zeros(3)  # 预事件速度加权和
+        self.accorr = np.zeros(3)  # 预事件段之后每个样点需扣除的加速度
+        self.ipga = ipre  # 当前PGA位置
+        self.pga = 0.0
+        self.nend = 0  # 能量窗口终点 (0表示尚未确定)
+        self.nwin = 0  # 最终输出窗口长度 (0表示尚未确定)
+        self.isdw = 0
+        self.iddw = 0
+        self.done = False
+
+    def push(self, packet: npt.NDArray[np.float64]) -> bool:
+        """
+        输入一个加速度数据包
+
+        参数说明:
+        packet: array, (m x 3) 加速度数据, 分量顺序与gv.icmp一致
+
+        返回值:
+        bool: 是否已完成基线校正
+        """
+        packet = np.asarray(packet, dtype=np.float64).reshape(-1, 3)
+        if self.done:
+            return True
+
+        # 跳过过长的预事件段
+        if self.nskip > 0:
+            m = min(self.nskip, len(packet))
+            self.nskip -= m
+            packet = packet[m:]
+
+        for a in packet:
+            self._step(a)
+            if self.nend == 0 and self._pga_window_closed():
+                self._close_window()
+            if self.nwin > 0 and self.n >= self.nwin:
+                self._finalize()
+                return True
+            if self.n >= self.nmax:
+                self.finish()
+                return True
+
+        return False
+
+    def finish(self) -> int:
+        """
+        数据流结束时强制完成基线校正
+
+        返回值:
+        nwin: int, 输出时间窗口长度 (0表示数据不足)
+        """
+        if self.done:
+            return self.nwin
+        if self.n <= self.ipre:
+            self.av.okay[self.ist] = False
+            self.done = True
+            self.nwin = 0
+            return 0
+        if self.nend == 0:
+            self.nend = self.n
+            self._close_window()
+        self.nwin = min(self.nwin, self.n)
+        self._finalize()
+        return self.nwin
+
+    def _grow(self):
+        """缓冲区容量加倍"""
+        size = min(self.nmax, 2 * len(self.ene))
+        for name in ("acc", "vel", "ene"):
+            old = getattr(self, name)
+            new = np.zeros((size,) + old.shape[1:], dtype=np.float64)
+            new[: len(old)] = old
+            setattr(self, name, new)
+
+    def _step(self, a: npt.NDArray[np.float64]):
+        """处理单个样点"""
+        i = self.n
+        dt = self.dt
+        ipre = self.ipre
+
+        # 能量窗口关闭后, isdw之后的样点不再影响结果
+        if self.nend > 0 and i > self.isdw:
+            self.n += 1
+            return
+        if i >= len(self.ene):
+            self._grow()
+
+        if i < ipre:
+            # 预事件段: 累积原始速度和线性拟合累加和
+            self.acc[i] = a
+            self.accsum += a
+            if i > 0:
+                self.vel[i] = self.vel[i - 1] + a * dt
+            self.sumy += self.vel[i]
+            self.sumxy += float(i) * self.vel[i]
+            self.n += 1
+            if self.n == ipre:
+                self._fit_pre_event()
+            return
+
+        # 事件段: 直接得到校正后的加速度和速度
+        self.acc[i] = a - self.accorr
+        self.vel[i] = self.vel[i - 1] + self.acc[i] * dt
+
+        # 累积能量并跟踪PGA
+        sigma = np.sqrt(np.sum(self.acc[i] ** 2))
+        self.ene[i] = self.ene[i - 1] + sigma
+        if sigma > self.pga:
+            self.pga = sigma
+            self.ipga = i
+        self.n += 1
+
+    def _fit_pre_event(self):
+        """预事件段结束时, 移除静态偏移并拟合预事件基线"""
+        ipre = self.ipre
+        dt = self.dt
+        t = np.arange(ipre, dtype=np.float64)
+
+        # 移除预事件静态偏移: 速度相应减去 preoff*dt*i
+        preoff = self.accsum / float(ipre)
+        sumx2 = float(ipre - 1) * float(ipre) * float(2 * ipre - 1) / 6.0
+        self.sumy -= preoff * dt * 0.5 * float(ipre) * float(ipre - 1)
+        self.sumxy -= preoff * dt * sumx2
+
+        for j in range(3):
+            al, bl = linefitsum(ipre, self.sumy[j], self.sumxy[j])
+            slope = (bl - al) / float(ipre - 1)
+            self.accorr[j] = preoff[j] + slope / dt
+
+            # 校正已缓存的预事件段
+            self.acc[:ipre, j] -= self.accorr[j]
+            self.vel[:ipre, j] -= preoff[j] * dt * t + al + slope * t
+
+    def _pga_window_closed(self) -> bool:
+        """
+        判断能量窗口是否可以关闭: 已到达 ipre + 20*(tpga-ponset)/dt,
+        且当前PGA之后已有PSTWIN的数据没有超过它
+        """
+        if self.n <= self.ipre or self.pga <= 0.0:
+            return False
+        av = self.av
+        ist = self.ist
+        tpga = av.start[ist] + self.ipga * self.dt
+        if tpga <= av.ponset[ist]:
+            return False
+        nend = self.ipre + 20 * round((tpga - av.ponset[ist]) / self.dt)
+
+        # PGA在PSTWIN内未被超过才关闭, 避免P波的早期峰值使窗口过早关闭
+        quiet = float(self.n - 1 - self.ipga) * self.dt >= self.const.PSTWIN
+        if self.n >= nend and quiet:
+            self.nend = self.n
+            return True
+        return False
+
+    def _close_window(self):
+        """能量窗口关闭: 确定SDW/DDW时间及输出窗口长度"""
+        av = self.av
+        ist = self.ist
+        const = self.const
+        dt = self.dt
+        ipre = self.ipre
+        nend = self.nend
+
+        ene = self.ene[ipre:nend]
+        isdw = ipre + np.searchsorted(ene, const.SDW * self.ene[nend - 1])
+        iddw = ipre + np.searchsorted(ene, const.DDW * self.ene[nend - 1])
+
+        av.tpga[ist] = av.start[ist] + self.ipga * dt
+        av.tsdw[ist] = av.start[ist] + isdw * dt
+        av.tddw[ist] = av.start[ist] + iddw * dt
+        if av.tsdw[ist] < av.tpga[ist]:
+            av.tpga[ist] = av.tsdw[ist]
+
+        # 调整长度
+        pstwin = min(av.tpga[ist] - av.start[ist], const.PSTWIN)
+        length = min(
+            av.length[ist],
+            float(self.nmax - 1) * dt,
+            av.tddw[ist] - av.start[ist] + pstwin,
+        )
+        av.length[ist] = length
+        av.okay[ist] = av.tsdw[ist] <= av.start[ist] + length - pstwin
+
+        # 选择信号和后事件时间窗口 (与smbscw一致)
+        self.ipgaw = 1 + int((av.tpga[ist] - av.start[ist]) / dt)
+        self.isdw = 1 + int((av.tsdw[ist] - av.start[ist]) / dt)
+        self.iddw = 1 + int((av.tddw[ist] - av.start[ist]) / dt)
+        self.nwin = max(
+            min(int(length / dt), self.iddw + self.isdw - ipre), self.isdw + 1
+        )
+
+    def _finalize(self):
+        """
+        触发单调基线校正
+
+        offset和rbserr只取决于isdw为止的速度, bscmono的窗口长度取isdw+1
+        (批处理中err[isdw+1:nwin]的填充不影响结果)
+        """
+        av = self.av
+        ist = self.ist
+        ipre = self.ipre
+        isdw = min(self.isdw, self.nwin - 1)
+        self.done = True
+
+        if not av.okay[ist]:
+            return
+        err = np.zeros(isdw + 1, dtype=np.float64)
+
+        for j in range(3):
+            # 寻找最大加速度
+            acc = np.abs(self.acc[ipre:isdw, j])
+            ipgaj = ipre + int(np.argmax(acc)) if len(acc) > 0 else ipre
+
+            # 进行单调基线校正
+            av.offset[j, ist], av.rbserr[j, ist] = bscmono(
+                isdw + 1,
+                ipre,
+                min(self.ipgaw, ipgaj),
+                isdw,
+                self.vel[: isdw + 1, j],
+                err,
+                self.dt,
+            )
+
+
+def smreplay(
+    const: Constants,
+    gv: GlobalVars,
+    av: AllocatableVars,
+    ist: int,
+    packet: int = 100,
+) -> bool:
+    """
+    将一个台站的记录文件按数据包回放给SmStream (离线检查流式处理)
+
+    记录的降采样方式与smgetsta相同.
+
+    参数:
+        const: Constants实例，包含常量
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例，包含可分配变量 (结果写回av.offset等)
+        ist: 台站索引
+        packet: 每个数据包的样点数 (降采样后)
+
+    返回:
+        bool: 数据是否足够 (即av.okay[ist])
+    """
+    dat = smreaddat(gv, av, ist)
+    nsam = round(gv.dt / av.sample[ist]) if av.sample[ist] < gv.dt else 1
+    nwin = len(dat) // nsam
+    acc = np.empty((nwin, 3), dtype=np.float64)
+    for i in range(nwin):
+        l = max(0, int((i - 0.5) * gv.dt / av.sample[ist]))
+        acc[i] = gv.accunit * np.mean(dat[l : l + nsam], axis=0, dtype=np.float64)
+
+    stream = SmStream(ist, gv, av, const)
+    for k in range(0, nwin, packet):
+        if stream.push(acc[k : k + packet]):
+            break
+    else:
+        stream.finish()
+    return bool(av.okay[ist])
@@ -0,0 +1,410 @@
+"""
+参数扫描与蒙特卡洛不确定性估计模块
+
+对处理参数 DTP, PREWIN, PSTWIN, SDW, DDW 以及P波到时ponset的扰动DPON
+进行网格或随机采样. 每个台站的记录只读取并降采样一次, 然后对所有参数组
+批量(向量化)完成smgetout/smbscw/bscmono的计算, 给出每个台站每个分量
+同震偏移的离散程度.
+"""
+
+import itertools
+import os
+import sys
+from typing import Dict, Optional, Sequence, Tuple
+import numpy as np
+import numpy.typing as npt
+from linefit import linefitsum
+from smalloc import Constants, GlobalVars, AllocatableVars
+from smgetinp import smgetinp
+from smgetout import smreaddat
+from smlog import log, smloginit, smlogstop, smprogress, smprogressend
+
+# 参数组的字段 (DPON为ponset的扰动量, 单位s)
+SWEEP_FIELDS: Tuple[str, ...] = ("DTP", "PREWIN", "PSTWIN", "SDW", "DDW", "DPON")
+SWEEP_DTYPE = np.dtype([(name, np.float64) for name in SWEEP_FIELDS])
+
+
+def _nominal(const: Constants) -> Dict[str, float]:
+    """常量中的标称参数值"""
+    values = {name: float(getattr(const, name, 0.0)) for name in SWEEP_FIELDS}
+    values["DPON"] = 0.0
+    return values
+
+
+def sweepgrid(const: Constants, **values: Sequence[float]) -> np.ndarray:
+    """
+    生成参数网格 (各字段取值的笛卡尔积)
+
+    参数:
+        const: Constants实例，未指定的字段取其标称值
+        values: 字段名 -> 取值序列, 例如 SDW=[0.8, 0.85, 0.9]
+
+    返回:
+        np.ndarray: SWEEP_DTYPE结构数组
+    """
+    nominal = _nominal(const)
+    for name in values:
+        if name not in SWEEP_FIELDS:
+            raise ValueError(f"未知的扫描参数: {name}")
+    axes = [np.atleast_1d(values.get(name, nominal[name])) for name in SWEEP_FIELDS]
+    grid = list(itertools.product(*axes))
+    return np.array(grid, dtype=SWEEP_DTYPE)
+
+
+def sweeprandom(
+    const: Constants,
+    nsam: int,
+    spread: Dict[str, float],
+    seed: Optional[int] = None,
+) -> np.ndarray:
+    """
+    生成蒙特卡洛随机参数组 (以标称值为中心的正态分布)
+
+    参数:
+        const: Constants实例，提供标称值
+        nsam: 参数组数量 (第一组始终为标称值)
+        spread: 字段名 -> 标准差, 例如 {"DPON": 0.2, "SDW": 0.02}
+        seed: 随机数种子
+
+    返回:
+        np.ndarray: SWEEP_DTYPE结构数组
+    """
+    nominal = _nominal(const)
+    rng = np.random.default_rng(seed)
+    params = np.zeros(nsam, dtype=SWEEP_DTYPE)
+    for name in SWEEP_FIELDS:
+        params[name] = nominal[name]
+        sd = spread.get(name, 0.0)
+        if sd > 0 and nsam > 1:
+            params[name][1:] += rng.normal(0.0, sd, nsam - 1)
+
+    # 保证参数落在有意义的范围内
+    params["DTP"] = np.maximum(params["DTP"], 0.0)
+    params["PREWIN"] = np.maximum(params["PREWIN"], 0.0)
+    params["PSTWIN"] = np.maximum(params["PSTWIN"], 0.0)
+    params["SDW"] = np.clip(params["SDW"], 0.0, 1.0)
+    params["DDW"] = np.clip(np.maximum(params["DDW"], params["SDW"]), 0.0, 1.0)
+    return params
+
+
+def _decimate(
+    dat: npt.NDArray[np.float64], sample: float, gv: GlobalVars
+) -> Tuple[npt.NDArray[np.float64], int]:
+    """
+    将完整记录一次性降采样至gv.dt (与smgetout中的逐点平均一致)
+
+    返回:
+        (acc, nsam): 降采样后乘以accunit的加速度 (ndec x 3) 及降采样因子
+    """
+    nraw = len(dat)
+    nsam = round(gv.dt / sample) if sample < gv.dt else 1
+    ndec = (nraw - 1) // nsam
+    i = np.arange(ndec, dtype=np.float64)
+    lo = np.maximum(0, ((i - 0.5) * gv.dt / sample).astype(np.int64))
+    hi = np.minimum(lo + nsam, nraw)
+    csum = np.zeros((nraw + 1, 3), dtype=np.float64)
+    np.cumsum(dat, axis=0, dtype=np.float64, out=csum[1:])
+    acc = gv.accunit * (csum[hi] - csum[lo]) / (hi - lo)[:, None]
+    return acc, nsam
+
+
+def _bscmonob(
+    vel: npt.NDArray[np.float64],
+    ipre: npt.NDArray[np.int64],
+    isdw: npt.NDArray[np.int64],
+    dt: float,
+) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """
+    批量单调基线校正 (与bscmono逐行等价, 只计算offset和rbserr)
+
+    参数说明:
+    vel: array, (n x L) 速度记录, 每行一组参数
+    ipre: array, 每行预事件窗口终点
+    isdw: array, 每行信号窗口终点
+    dt: float, 采样时间间隔
+
+    返回值:
+    offset, rbserr: array, 每行的基线偏移值和校正误差
+    """
+    n, nlen = vel.shape
+    rows = np.arange(n)
+    i = np.arange(nlen)[None, :]
+    win = (i >= ipre[:, None]) & (i <= isdw[:, None])
+
+    # 计算信号窗口内的速度变化率
+    beta = np.zeros_like(vel)
+    beta[:, 1:] = (vel[:, 1:] - vel[:, :-1]) / dt
+    beta = np.where(win, beta, 0.0)
+
+    # 寻找速度最大变化率
+    imax = np.argmax(np.abs(beta), axis=1)
+    bmax = beta[rows, imax]
+    nonzero = np.abs(bmax) > 0
+
+    # 计算累积效应和单调性指标
+    beta /= np.where(nonzero, bmax, 1.0)[:, None]
+    cumbeta = np.cumsum(beta, axis=1)
+    mono = np.where(
+        i < imax[:, None],
+        np.clip(cumbeta, 0.0, 1.0),
+        np.clip(2.0 - cumbeta, 0.0, 1.0),
+    )
+    mono = np.where(win, mono, 0.0)
+
+    # 计算基线偏移和校正误差
+    count = np.sum(mono, axis=1)
+    safe = np.where(count > 0, count, 1.0)
+    offset = np.sum(vel * mono, axis=1) / safe
+    rbserr = np.sqrt(np.sum((vel - offset[:, None]) ** 2 * mono, axis=1) / safe)
+    offset = np.where(count > 0, offset, 0.0)
+    rbserr = np.where(count > 0, rbserr, 0.0)
+
+    # 如果没有显著的速度变化
+    npts = np.maximum(np.sum(win, axis=1), 1)
+    mean = np.sum(vel * win, axis=1) / npts
+    std = np.sqrt(np.sum((vel - mean[:, None]) ** 2 * win, axis=1) / npts)
+    offset = np.where(nonzero, offset, mean)
+    rbserr = np.where(nonzero, rbserr, std)
+
+    return offset, rbserr
+
+
+def _sweepsta(
+    gv: GlobalVars,
+    av: AllocatableVars,
+    ist: int,
+    dat: npt.NDArray[np.float64],
+    acc: npt.NDArray[np.float64],
+    nsam: int,
+    params: np.ndarray,
+) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64], npt.NDArray[np.bool_]]:
+    """
+    对单个台站批量计算一组参数的同震偏移
+
+    返回:
+        (offset, rbserr, okay): (npar x 3), (npar x 3), (npar,)
+    """
+    npar = len(params)
+    nraw = len(dat)
+    ndec = len(acc)
+    sample = av.sample[ist]
+    start = av.start[ist]
+    dt = gv.dt
+    ponset = av.ponset[ist] + params["DPON"]
+
+    # ---- 原始采样率: 确定PGA、SDW和DDW时间 (对应smgetout) ----
+    ipre = 1 + ((ponset - start - params["DTP"]) / sample).astype(np.int64)
+    ipre = np.clip(ipre, 1, nraw - 1)
+
+    # 预事件去均值后再扣除事件后均值, 等价于扣除 mean(dat[ipre:])
+    csum = np.zeros((nraw + 1, 3), dtype=np.float64)
+    np.cumsum(dat, axis=0, dtype=np.float64, out=csum[1:])
+    center = (csum[nraw] - csum[ipre]) / (nraw - ipre)[:, None]
+
+    idx = np.arange(nraw)[None, :]
+    sigma = np.sqrt(np.sum((dat[None, :, :] - center[:, None, :]) ** 2, axis=2))
+    sigma = np.where(idx >= ipre[:, None], sigma, 0.0)
+    ipga = np.maximum(np.argmax(sigma, axis=1), ipre)
+    ene = np.cumsum(sigma, axis=1)
+    del sigma
+
+    tpga = start + ipga * sample
+    nend = ipre + 20 * np.round((tpga - ponset) / sample).astype(np.int64)
+    nend = np.clip(nend, 1, nraw)
+    etot = ene[np.arange(npar), nend - 1]
+    inwin = (idx >= ipre[:, None]) & (idx < nend[:, None])
+    isdw = ipre + np.sum(inwin & (ene < (params["SDW"] * etot)[:, None]), axis=1)
+    iddw = ipre + np.sum(inwin & (ene < (params["DDW"] * etot)[:, None]), axis=1)
+    del ene, inwin
+
+    tsdw = start + isdw * sample
+    tddw = start + iddw * sample
+    tpga = np.minimum(tpga, tsdw)
+
+    pstwin = np.minimum(tpga - start, params["PSTWIN"])
+    length = np.minimum((nraw - 1) * sample, tddw - start + pstwin)
+    okay = tsdw <= start + length - pstwin
+
+    # ---- 降采样序列: 对应smbscw ----
+    nwin = (length / sample).astype(np.int64) // nsam
+    iprd = 1 + ((ponset - start - params["DTP"]) / dt).astype(np.int64)
+    k = iprd - 1 - (6.0 * params["PREWIN"] / dt).astype(np.int64)
+    k = np.maximum(k, 0)
+    iprd -= k
+    nwin -= k
+    startd = start + k * dt
+
+    ipgad = 1 + ((tpga - startd) / dt).astype(np.int64)
+    isdwd = 1 + ((tsdw - startd) / dt).astype(np.int64)
+    iddwd = 1 + ((tddw - startd) / dt).astype(np.int64)
+    nwin = np.minimum(nwin, iddwd + isdwd - iprd)
+    okay &= (iprd >= 2) & (isdwd >= iprd) & (isdwd < nwin) & (ipgad >= 0)
+
+    offset = np.full((npar, 3), np.nan)
+    rbserr = np.full((npar, 3), np.nan)
+    if not np.any(okay):
+        return offset, rbserr, okay
+
+    sel = np.nonzero(okay)[0]
+    iprd, isdwd, k = iprd[sel], isdwd[sel], k[sel]
+    nlen = int(np.max(isdwd)) + 1
+    t = np.arange(nlen)
+    a = acc[np.clip(k[:, None] + t[None, :], 0, ndec - 1)].transpose(0, 2, 1)
+
+    # 移除预事件静态偏移
+    pre = (t[None, :] < iprd[:, None])[:, None, :]
+    a -= (np.sum(a * pre, axis=2) / iprd[:, None])[:, :, None]
+
+    # 积分得到速度, 并拟合扣除预事件线性基线
+    vel = np.zeros_like(a)
+    vel[:, :, 1:] = np.cumsum(a[:, :, 1:] * dt, axis=2)
+    n = iprd[:, None].astype(np.float64)
+    al, bl = linefitsum(n, np.sum(vel * pre, axis=2), np.sum(vel * pre * t, axis=2))
+    vel -= al[:, :, None] + ((bl - al) / (n - 1.0))[:, :, None] * t
+
+    # 单调基线校正
+    o, r = _bscmonob(
+        vel.reshape(-1, nlen), np.repeat(iprd, 3), np.repeat(isdwd, 3), dt
+    )
+    offset[sel] = o.reshape(-1, 3)
+    rbserr[sel] = r.reshape(-1, 3)
+    return offset, rbserr, okay
+
+
+def smsweep(
+    const: Constants,
+    gv: GlobalVars,
+    av: AllocatableVars,
+    params: np.ndarray,
+    chunk: int = 64,
+) -> Tuple[npt.NDArray[np.float64], npt.NDArray[np.float64], npt.NDArray[np.bool_]]:
+    """
+    对所有台站进行参数扫描
+
+    参数:
+        const: Constants实例，包含常量
+        gv: GlobalVars实例，包含全局变量
+        av: AllocatableVars实例，包含可分配变量 (不被修改)
+        params: SWEEP_DTYPE结构数组 (见sweepgrid/sweeprandom)
+        chunk: 每批同时计算的参数组数量, 用于限制内存
+
+    返回:
+        (offset, rbserr, okay): (npar x 3 x nst), (npar x 3 x nst), (npar x nst)
+    """
+    npar = len(params)
+    offset = np.full((npar, 3, gv.nst), np.nan)
+    rbserr = np.full((npar, 3, gv.nst), np.nan)
+    okay = np.zeros((npar, gv.nst), dtype=np.bool_)
+
+    log.info(f" 参数扫描: {npar}组参数, {gv.nst}个台站")
+    smprogress(gv.nst)
+    try:
+        for ist in range(gv.nst):
+            # 每个台站只读取和降采样一次
+            dat = smreaddat(gv, av, ist)
+            acc, nsam = _decimate(dat, av.sample[ist], gv)
+            for p0 in range(0, npar, chunk):
+                p1 = min(p0 + chunk, npar)
+                o, r, ok = _sweepsta(gv, av, ist, dat, acc, nsam, params[p0:p1])
+                offset[p0:p1, :, ist] = o
+                rbserr[p0:p1, :, ist] = r
+                okay[p0:p1, ist] = ok
+
+            nok = int(np.sum(okay[:, ist]))
+            log.debug(
+                f"{av.stcode[ist]}   ... 参数扫描: {nok}/{npar}组有效",
+                extra={
+                    "station": av.stcode[ist],
+                    "okay": nok > 0,
+                    "reason": "" if nok > 0 else "sweep_none_valid",
+                    "nok": nok,
+                },
+            )
+    finally:
+        smprogressend()
+
+    return offset, rbserr, okay
+
+
+def smsweepout(
+    const: Constants,
+    gv: GlobalVars,
+    av: AllocatableVars,
+    offset: npt.NDArray[np.float64],
+    okay: npt.NDArray[np.bool_],
+    outfile: str = "sweep.dat",
+):
+    """
+    输出每个台站每个分量同震偏移的离散程度
+
+    参数:
+        offset, okay: smsweep的返回值
+        outfile: 输出文件名 (位于gv.outdir)
+    """
+    cmpname = ("East", "North", "Up")
+    with open(os.path.join(gv.outdir, outfile), "w") as f:
+        f.write(
+            "   Station Cmp    Nok    Mean[m]     Std[m]     P16[m]     P84[m]"
+            "     Min[m]     Max[m]\n"
+        )
+        for ist in range(gv.nst):
+            nok = int(np.sum(okay[:, ist]))
+            for j in range(3):
+                f.write(f"{av.stcode[ist]:10} {cmpname[j]:5} {nok:5d}")
+                if nok == 0:
+                    f.write("".join(f" {'NaN':>10}" for _ in range(6)) + "\n")
+                    continue
+                v = offset[okay[:, ist], j, ist]
+                p16, p84 = np.percentile(v, [16.0, 84.0])
+                f.write(
+                    f" {np.mean(v):10.4f} {np.std(v):10.4f}"
+                    f" {p16:10.4f} {p84:10.4f}"
+                    f" {np.min(v):10.4f} {np.max(v):10.4f}\n"
+                )
+
+
+def main():
+    """
+    参数扫描入口: python smsweep.py <输入文件> [参数组数量] [随机种子]
+    """
+    try:
+        input_file = "smblc20230206_turkey_M77.inp"
+        if len(sys.argv) > 1:
+            input_file = sys.argv[1]
+        nsam = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+        seed = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+        smloginit()
+        log.info("Reading data...")
+        const, gv, av, success = smgetinp(input_file)
+        if not success:
+            raise ValueError("Failed to read input file")
+        smloginit(os.path.join(gv.outdir, "smblc.jsonl"))
+
+        spread = {
+            "DTP": 0.3,
+            "PREWIN": 1.0,
+            "PSTWIN": 5.0,
+            "SDW": 0.02,
+            "DDW": 0.02,
+            "DPON": 0.2,
+        }
+        params = sweeprandom(const, nsam, spread, seed)
+
+        log.info("Performing parameter sweep...")
+        offset, rbserr, okay = smsweep(const, gv, av, params)
+        smsweepout(const, gv, av, offset, okay)
+
+        log.info("Sweep completed successfully")
+        return 0
+
+    except Exception as e:
+        log.error(f"Error: {str(e)}")
+        return 1
+
+    finally:
+        smlogstop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
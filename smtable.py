@@ -0,0 +1,160 @@
+"""
+输入文件的整体读取与台站表解析
+
+一次读入整个文件, 去除注释行后按行号保留有效行; SMDataInfo.dat的台站部分
+一次性转换为类型化的列 (code, lat, lon, start, ponset, length, sample),
+出错时给出文件中的行号.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+import numpy.typing as npt
+from skipdoc import iscomment
+
+# 台站表的数值列 (台站代码之后的6列)
+STATION_COLUMNS: Tuple[str, ...] = ("lat", "lon", "start", "ponset", "length", "sample")
+
+
+@dataclass(frozen=True)
+class StationTable:
+    """SMDataInfo.dat中的台站表"""
+
+    code: List[str]  # 台站代码
+    lat: npt.NDArray[np.float64]  # 纬度(度)
+    lon: npt.NDArray[np.float64]  # 经度(度)
+    start: npt.NDArray[np.float64]  # 记录起始时间(s)
+    ponset: npt.NDArray[np.float64]  # P波到时(s)
+    length: npt.NDArray[np.float64]  # 记录长度(s)
+    sample: npt.NDArray[np.float64]  # 采样间隔(s)
+    lineno: npt.NDArray[np.int64]  # 在文件中的行号
+
+
+class DocLines:
+    """整体读入的输入文件, 按顺序提供去除注释后的有效行"""
+
+    def __init__(self, path: str):
+        """
+        参数:
+            path: 文件路径
+        """
+        self.path = path
+        with open(path, "r") as f:
+            self.lines = f.read().splitlines()
+        self.pos = 0
+
+    def next(self) -> Tuple[int, str]:
+        """
+        返回下一个非注释非空行
+
+        返回:
+            (lineno, line): 行号(从1开始)和去除首尾空白的内容,
+                到达文件末尾时为(0, "")
+        """
+        while self.pos < len(self.lines):
+            line = self.lines[self.pos]
+            self.pos += 1
+            if not iscomment(line):
+                return self.pos, line.strip()
+        return 0, ""
+
+    def options(self, names: Sequence[str]) -> Dict[str, Tuple[int, str]]:
+        """
+        读取其余部分中 "名称 = 值" 形式的设置行
+
+        名称不在names中的行按注释规则处理; 以"c"/"C"开头的行只要是已知
+        名称的设置(如"cachedir = ...")就视为设置而不是注释.
+
+        参数:
+            names: 允许的设置名称
+
+        返回:
+            Dict[str, Tuple[int, str]]: 名称 -> (行号, 去除引号的值)
+        """
+        found = {}
+        while self.pos < len(self.lines):
+            line = self.lines[self.pos].strip()
+            self.pos += 1
+            match = re.fullmatch(r"(\w+)\s*=\s*(.*)", line)
+            if match and match.group(1).lower() in names:
+                value = match.group(2).strip().strip("'\"")
+                found[match.group(1).lower()] = (self.pos, value)
+            elif not iscomment(line):
+                raise ValueError(f"{self.path} 第{self.pos}行: 无法识别的设置: {line}")
+        return found
+
+    def stations(self, nst: int) -> StationTable:
+        """
+        一次性读取其余部分中的nst行台站数据
+
+        以"c"/"C"开头而又能按台站格式解析的行视为台站数据(台站代码以C开头),
+        以"#"、"!"开头的行和空行总是跳过, 其余以"c"/"C"开头的行视为注释.
+
+        参数:
+            nst: 台站数量
+
+        返回:
+            StationTable: 台站表
+        """
+        linenos = []
+        rows = []
+        for lineno in range(self.pos + 1, len(self.lines) + 1):
+            if len(rows) >= nst:
+                break
+            line = self.lines[lineno - 1].strip()
+            if not line or line.startswith(("#", "!")):
+                continue
+            parts = line.split()
+            if iscomment(line) and not _isstation(parts):
+                continue
+            linenos.append(lineno)
+            rows.append(parts)
+
+        if len(rows) < nst:
+            raise ValueError(f"无法读取台站 {len(rows)+1} 的数据 ({self.path})")
+        self.pos = linenos[-1] if linenos else self.pos
+
+        # 检查每行的列数
+        ncol = np.array([len(parts) for parts in rows])
+        short = np.nonzero(ncol < 1 + len(STATION_COLUMNS))[0]
+        if len(short) > 0:
+            i = short[0]
+            raise ValueError(
+                f"{self.path} 第{linenos[i]}行: 台站数据应有"
+                f" {1 + len(STATION_COLUMNS)} 列, 实际为 {ncol[i]} 列"
+            )
+
+        # 一次性转换数值列
+        text = np.array(
+            [parts[1 : 1 + len(STATION_COLUMNS)] for parts in rows], dtype=str
+        ).reshape(-1, len(STATION_COLUMNS))
+        try:
+            values = text.astype(np.float64)
+        except ValueError:
+            for i, parts in enumerate(rows):
+                if not _isstation(parts):
+                    raise ValueError(
+                        f"{self.path} 第{linenos[i]}行: 无法解析台站数据: "
+                        f"{self.lines[linenos[i] - 1].strip()}"
+                    )
+            raise
+
+        columns = {name: values[:, k] for k, name in enumerate(STATION_COLUMNS)}
+        return StationTable(
+            code=[parts[0] for parts in rows],
+            lineno=np.array(linenos, dtype=np.int64),
+            **columns,
+        )
+
+
+def _isstation(parts: List[str]) -> bool:
+    """判断一行拆分后的字段是否符合台站数据格式"""
+    if len(parts) < 1 + len(STATION_COLUMNS):
+        return False
+    try:
+        for token in parts[1 : 1 + len(STATION_COLUMNS)]:
+            float(token)
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,45 @@
+"""
+台站目录(smcatalog)的候选台站与全部台站直接计算震中距的一致性检查
+"""
+
+import numpy as np
+from disazi import disazis
+from smcatalog import smcandidates
+from smtable import DocLines
+
+REARTH = 6371.0e3
+HYPO = (38.0, 37.0)
+DMIN, DMAX = 0.0, 100.0e3
+
+
+def _table(path, rows):
+    path.write_text("2023 2 6 1 17 34.0\n" + "".join(f"{r}\n" for r in rows))
+    inp = DocLines(str(path))
+    inp.next()
+    return inp.stations(len(rows))
+
+
+def _inrange(table):
+    dn, de = disazis(REARTH, HYPO[0], HYPO[1], table.lat, table.lon)
+    dis = np.sqrt(dn**2 + de**2)
+    return np.nonzero((dis >= DMIN) & (dis <= DMAX))[0]
+
+
+def _candidates(catalog, source, table):
+    rows, _ = smcandidates(catalog, str(source), table, *HYPO, DMIN, DMAX, REARTH)
+    return rows
+
+
+def test_code_shared_between_sources(tmp_path):
+    catalog = str(tmp_path / "catalog.npz")
+
+    # 两个台网都有台站X01, 坐标不同
+    a = tmp_path / "a.dat"
+    b = tmp_path / "b.dat"
+    table_a = _table(a, ["X01 38.1 37.1 0 10 100 0.01", "A02 38.2 37.2 0 10 100 0.01"])
+    table_b = _table(b, ["X01 45.0 10.0 0 10 100 0.01", "B02 38.3 37.3 0 10 100 0.01"])
+
+    for source, table in ((a, table_a), (b, table_b), (a, table_a)):
+        rows = _candidates(catalog, source, table)
+        assert set(_inrange(table)) <= set(rows)
+    assert list(_candidates(catalog, a, table_a)) == [0, 1]
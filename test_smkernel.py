@@ -0,0 +1,74 @@
+"""
+计算内核各后端(numpy/numba)与逐点循环参考实现的一致性检查
+
+未安装numba时跳过numba后端.
+"""
+
+import numpy as np
+import pytest
+import smkernel
+
+KERNEL_RTOL = 1e-10
+
+
+def _numba_kernels():
+    """编译(并预热)numba内核, 不改变当前后端"""
+    pytest.importorskip("numba")
+    current = smkernel.getbackend()
+    smkernel.setbackend("numba")
+    smkernel.setbackend(current)
+    return dict(smkernel._JIT)
+
+
+BACKENDS = {
+    "numpy": lambda: smkernel._NUMPY,
+    "numba": _numba_kernels,
+}
+
+
+def _run(kernels, seed=0):
+    """用固定随机数种子的输入调用各内核, 返回 内核名 -> 结果数组"""
+    rng = np.random.default_rng(seed)
+    res = {}
+    x = rng.standard_normal(500)
+    out = np.zeros(500)
+    kernels["cumint"](x, 0.01, out)
+    res["cumint"] = out
+
+    # smbscw以(nwin x 3)数组的列调用cumint
+    buf = np.zeros((500, 3))
+    buf[:, 0] = x
+    kernels["cumint"](buf[:, 0], 0.01, buf[:, 1])
+    res["cumint_column"] = buf[:, 1].copy()
+
+    vel = np.cumsum(x) * 0.01
+    beta = np.diff(vel[99:301]) / 0.01
+    imax = int(np.argmax(np.abs(beta)))
+    beta /= beta[imax]
+    err = np.zeros(500)
+    offset, rbserr, count = kernels["monofit"](vel, beta, 100, imax, err)
+    res["monofit"] = np.array([offset, rbserr, count, *err])
+
+    p = np.zeros((200, 7))
+    kernels["legendre"](200, 6, p)
+    res["legendre"] = p
+
+    y = np.concatenate([np.zeros(100), np.linspace(0, 1, 100), np.ones(300)])
+    y += 0.01 * x
+    swap = np.zeros((500, 2))
+    swap[10:, 0] = np.cumsum(y[10:][::-1])[::-1]
+    swap[:400, 1] = np.cumsum(np.arange(1, 401) * y[:400])
+    res["rampsearch"] = np.array(kernels["rampsearch"](500, 10, 400, swap))
+    return res
+
+
+@pytest.mark.parametrize("backend", sorted(BACKENDS))
+def test_backend_matches_loops(backend):
+    kernels = BACKENDS[backend]()
+    ref = _run(smkernel._LOOPS)
+    res = _run(kernels)
+    for kernel, value in ref.items():
+        scale = max(np.max(np.abs(value)), 1.0)
+        np.testing.assert_allclose(
+            res[kernel], value, rtol=0.0, atol=KERNEL_RTOL * scale, err_msg=kernel
+        )
@@ -0,0 +1,80 @@
+"""
+文件系统任务队列(smqueue)与串行处理(smgetout)的一致性检查
+
+以多个本机进程运行smqueue.py, 比较coseis.dat和各台站*_blc.dat的字节.
+"""
+
+import glob
+import os
+import subprocess
+import sys
+import time
+import pytest
+from smgetinp import smgetinp
+from smgetout import smgetout
+from smqueue import _qdir, smqinit
+from smregress import smsynth
+
+SMQUEUE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "smqueue.py")
+
+
+def _outputs(outdir):
+    """输出目录中coseis.dat和*_blc.dat的内容"""
+    paths = [os.path.join(outdir, "coseis.dat")]
+    paths += sorted(glob.glob(os.path.join(outdir, "*_blc.dat")))
+    out = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            out[os.path.basename(path)] = f.read()
+    return out
+
+
+def _smqueue(*args):
+    subprocess.run([sys.executable, SMQUEUE, *args], check=True)
+
+
+@pytest.fixture
+def serial(tmp_path):
+    input_file = smsynth(str(tmp_path / "serial"), "network")
+    const, gv, av, success = smgetinp(input_file)
+    assert success
+    assert smgetout(const, gv, av)
+    return _outputs(gv.outdir)
+
+
+def test_local_matches_serial(tmp_path, serial):
+    input_file = smsynth(str(tmp_path / "queue"), "network")
+    _smqueue("local", input_file, "3")
+
+    const, gv, av, success = smgetinp(input_file)
+    assert success
+    assert os.listdir(_qdir(gv, "todo")) == []
+    assert os.listdir(_qdir(gv, "claimed")) == []
+    assert _outputs(gv.outdir) == serial
+
+
+def test_stale_claim_is_requeued(tmp_path, serial):
+    input_file = smsynth(str(tmp_path / "queue"), "network")
+    const, gv, av, success = smgetinp(input_file)
+    assert success
+    nshard = smqinit(gv, av, 4)
+
+    # 一个已失效进程的认领: 修改时间早于默认的心跳超时(600 s)
+    shard = "shard_00002.json"
+    stale = os.path.join(_qdir(gv, "claimed"), f"{shard}.deadhost.1")
+    os.rename(os.path.join(_qdir(gv, "todo"), shard), stale)
+    old = time.time() - 3600.0
+    os.utime(stale, (old, old))
+
+    workers = [
+        subprocess.Popen([sys.executable, SMQUEUE, "work", input_file])
+        for _ in range(2)
+    ]
+    assert [p.wait() for p in workers] == [0, 0]
+    assert not os.path.exists(stale)
+    assert sorted(os.listdir(_qdir(gv, "done"))) == [
+        f"shard_{k:05d}.json" for k in range(nshard)
+    ]
+
+    _smqueue("merge", input_file)
+    assert _outputs(gv.outdir) == serial
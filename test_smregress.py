@@ -0,0 +1,11 @@
+"""
+合成事件的黄金输出和性能预算检查 (与 python smregress.py check 相同)
+"""
+
+import pytest
+from smregress import REGRESS_EVENTS, REGRESS_ROOT, smregcheck
+
+
+@pytest.mark.parametrize("name", sorted(REGRESS_EVENTS))
+def test_golden(name):
+    assert smregcheck(REGRESS_ROOT, name) == []
@@ -0,0 +1,75 @@
+"""
+流式基线校正(SmStream)与批处理(smgetout + smbscw)的一致性检查
+
+使用smregress的合成事件. 两者的差异来自能量曲线的计算方式(降采样序列,
+不扣除accoff), 远场小偏移台站的差异相对较大, 因此按事件给出容差:
+offset和rbserr为 rtol*(该台站批处理结果的最大绝对值) + atol,
+tsdw/tddw为相对于P波到时之后持续时间的比例.
+实测 (max|diff|): nearfield offset 0.39 mm, tddw 0.29 s;
+network offset 1.3 mm (最大为台站峰值偏移的19%), tddw 10 s.
+"""
+
+import numpy as np
+import pytest
+from smgetinp import smgetinp
+from smgetout import smgetout
+from smregress import REGRESS_EVENTS, smsynth
+from smstream import smreplay
+
+# 事件 -> 容差: offset/rbserr为(rtol, atol[m]), tsdw/tddw为相对持续时间的比例
+STREAM_BOUNDS = {
+    "nearfield": {
+        "offset": (0.02, 0.0),
+        "rbserr": (0.02, 0.0),
+        "tsdw": 0.02,
+        "tddw": 0.03,
+    },
+    "network": {
+        "offset": (0.05, 1.0e-3),
+        "rbserr": (0.1, 0.0),
+        "tsdw": 0.1,
+        "tddw": 0.3,
+    },
+}
+
+
+def _check(name, key, stream, batch):
+    """按STREAM_BOUNDS检查(3 x nst)结果"""
+    rtol, atol = STREAM_BOUNDS[name][key]
+    bound = rtol * np.max(np.abs(batch), axis=0) + atol
+    diff = np.abs(stream - batch)
+    bad = np.argwhere(diff > bound)
+    assert len(bad) == 0, (
+        f"{name} {key}: (分量, 台站) {bad.tolist()} 差 "
+        f"{diff[tuple(bad.T)].tolist()} 超出 {bound[bad[:, 1]].tolist()}"
+    )
+
+
+@pytest.mark.parametrize("name", sorted(REGRESS_EVENTS))
+@pytest.mark.parametrize("packet", [1, 37, 100000])
+def test_stream_matches_batch(tmp_path, name, packet):
+    input_file = smsynth(str(tmp_path), name)
+
+    const, gv, av, success = smgetinp(input_file)
+    assert success
+    assert smgetout(const, gv, av)
+
+    sconst, sgv, sav, success = smgetinp(input_file)
+    assert success
+    for ist in range(sgv.nst):
+        smreplay(sconst, sgv, sav, ist, packet)
+
+    nst = sgv.nst
+    assert list(sav.okay[:nst]) == list(av.okay[:nst])
+    okay = av.okay[:nst]
+    for key in ("offset", "rbserr"):
+        _check(
+            name,
+            key,
+            getattr(sav, key)[:, :nst][:, okay],
+            getattr(av, key)[:, :nst][:, okay],
+        )
+    for key in ("tsdw", "tddw"):
+        duration = getattr(av, key)[:nst] - av.ponset[:nst]
+        diff = np.abs(getattr(sav, key)[:nst] - getattr(av, key)[:nst])
+        assert np.all(diff <= STREAM_BOUNDS[name][key] * duration), (key, diff)
@@ -0,0 +1,61 @@
+"""
+SMDataInfo.dat台站表解析 (DocLines.stations) 的检查
+"""
+
+import pytest
+from smtable import DocLines
+
+HEADER = "c 台站表\n2023 2 6 1 17 34.0\n"
+
+
+def _stations(tmp_path, body, nst):
+    path = tmp_path / "SMDataInfo.dat"
+    path.write_text(HEADER + body)
+    inp = DocLines(str(path))
+    inp.next()
+    return inp.stations(nst)
+
+
+def test_station_codes_starting_with_c(tmp_path):
+    table = _stations(
+        tmp_path,
+        "C 以C开头的注释\n"
+        "CHN1 38.0 37.0 0 10 100 0.01\n"
+        "c--- 分隔\n"
+        "cst2 38.1 37.1 0 10 100 0.01\n",
+        2,
+    )
+    assert table.code == ["CHN1", "cst2"]
+    assert list(table.lineno) == [4, 6]
+    assert list(table.lat) == [38.0, 38.1]
+
+
+def test_commented_rows_are_skipped(tmp_path):
+    table = _stations(
+        tmp_path,
+        "#ST01 38.0 37.0 0 10 100 0.01\n"
+        "!ST00 38.0 37.0 0 10 100 0.01\n"
+        "\n"
+        "CHN1 38.1 37.1 0 10 100 0.01\n"
+        "ST02 38.2 37.2 0 10 100 0.01\n",
+        2,
+    )
+    assert table.code == ["CHN1", "ST02"]
+    assert list(table.lineno) == [6, 7]
+
+
+def test_too_few_stations(tmp_path):
+    with pytest.raises(ValueError, match="无法读取台站 2 的数据"):
+        _stations(tmp_path, "ST01 38.0 37.0 0 10 100 0.01\n# ST02\n", 2)
+
+
+@pytest.mark.parametrize(
+    "row, message",
+    [
+        ("ST02 38.1 37.1 0 10 100", "第4行: 台站数据应有 7 列, 实际为 6 列"),
+        ("ST02 38.1 east 0 10 100 0.01", "第4行: 无法解析台站数据"),
+    ],
+)
+def test_parse_errors_give_line_number(tmp_path, row, message):
+    with pytest.raises(ValueError, match=message):
+        _stations(tmp_path, f"ST01 38.0 37.0 0 10 100 0.01\n{row}\n", 2)